@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import User, Food, Order, Cart, Discount, FoodRating ,OrderItem,CartItem,CommentReply
+from .sales import record_status_change
+from .search import filter_matching
 
 class UserAdmin(UserAdmin):
     list_display = ('username', 'first_name', 'last_name', 'email', 'role', 'is_staff', 'is_active')
@@ -19,8 +21,14 @@ class UserAdmin(UserAdmin):
 class FoodAdmin(admin.ModelAdmin):
     list_display = ('name', 'category', 'price', 'stock', 'rating')
     list_filter = ('category', 'created_by')
-    search_fields = ('name', 'category')
+    search_fields = ('name', 'description')
     ordering = ('name',)
+    # Food.save never writes these, see Food.COUNTER_FIELDS.
+    readonly_fields = Food.COUNTER_FIELDS
+
+    def get_search_results(self, request, queryset, search_term):
+        # The full-text index instead of a LIKE scan per search field.
+        return filter_matching(queryset, search_term), False
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -28,14 +36,26 @@ class OrderItemInline(admin.TabularInline):
 
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'customer', 'status', 'total_price', 'order_date')
+    list_select_related = ('customer',)
     inlines = [OrderItemInline]
-    
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('items__food')
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        record_status_change(form.instance, form.initial.get('status') if change else None)
+
     def total_price(self, obj):
         return sum(item.total_price for item in obj.items.all())
     total_price.short_description = 'Total Price'
 
 class CartAdmin(admin.ModelAdmin):
     list_display = ('customer', 'get_food_names', 'get_quantities', 'get_total_price')
+    list_select_related = ('customer',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('items__food')
 
     def get_food_names(self, obj):
         return ", ".join([item.food.name for item in obj.items.all()])
@@ -56,6 +76,7 @@ class DiscountAdmin(admin.ModelAdmin):
 
 class FoodRatingAdmin(admin.ModelAdmin):
     list_display = ('food', 'user', 'rating', 'created_at')
+    list_select_related = ('food', 'user')
     list_filter = ('rating', 'created_at')
     search_fields = ('food__name', 'user__username')
 
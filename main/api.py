@@ -0,0 +1,169 @@
+import hashlib
+
+from django.db.models import Count, Max, Prefetch
+from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
+from rest_framework import generics
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from main.menu import request_menu_stamp
+from main.models import Cart, CartItem, Food, Order, OrderItem
+from main.serializers import CartSerializer, FoodSerializer, OrderSerializer
+
+
+class FoodCursorPagination(CursorPagination):
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class OrderCursorPagination(CursorPagination):
+    ordering = ('-order_date', '-id')
+    page_size = 20
+
+
+def _etag(request, *parts):
+    """Strong ETag over the validator ``parts`` and the query string.
+
+    The query string is folded in because fields, cursor and page size each
+    give the same rows a different body.
+    """
+    digest = hashlib.md5(repr((parts, request.META.get('QUERY_STRING', ''))).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def _foods(request):
+    foods = Food.objects.all()
+    category = request.query_params.get('category')
+    if category:
+        foods = foods.filter(category=category)
+    return foods
+
+
+def _menu_etag(request, *args, **kwargs):
+    stamp = request_menu_stamp(request, request.query_params.get('category') or None)
+    return _etag(request, stamp) if stamp else None
+
+
+def _menu_modified(request, *args, **kwargs):
+    stamp = request_menu_stamp(request, request.query_params.get('category') or None)
+    return stamp and stamp[1]
+
+
+def _food_modified(request, food_id):
+    if not hasattr(request, '_food_modified'):
+        request._food_modified = Food.objects.filter(pk=food_id).values_list('updated_at', flat=True).first()
+    return request._food_modified
+
+
+def _food_etag(request, food_id):
+    modified = _food_modified(request, food_id)
+    return _etag(request, food_id, modified) if modified else None
+
+
+def _cart_etag(request, *args, **kwargs):
+    state = (
+        Cart.objects.filter(customer=request.user)
+        .annotate(lines=Count('items'), last_line=Max('items__id'), foods_modified=Max('items__food__updated_at'))
+        .values_list('subtotal', 'item_count', 'lines', 'last_line', 'foods_modified')
+        .first()
+    )
+    return _etag(request, state)
+
+
+def _orders_etag(request, *args, **kwargs):
+    # The items show their food's current name and price, so food edits count too.
+    state = Order.objects.filter(customer=request.user).aggregate(
+        count=Count('id', distinct=True), last_id=Max('id'), modified=Max('updated_at'),
+        foods_modified=Max('items__food__updated_at'),
+    )
+    return _etag(request, *state.values())
+
+
+def _order_etag(request, order_id):
+    state = (
+        Order.objects.filter(pk=order_id, customer=request.user)
+        .annotate(foods_modified=Max('items__food__updated_at'))
+        .values_list('updated_at', 'foods_modified')
+        .first()
+    )
+    return _etag(request, order_id, *state) if state else None
+
+
+def _order_items():
+    return Prefetch('items', queryset=OrderItem.objects.select_related('food'))
+
+
+class FoodListAPIView(generics.ListAPIView):
+    """The menu, newest first, filtered by ``?category=``.
+
+    Unchanged pages answer 304 off the category's menu stamp, before any
+    food is read or serialized.
+    """
+    serializer_class = FoodSerializer
+    pagination_class = FoodCursorPagination
+
+    def get_queryset(self):
+        foods = _foods(self.request)
+        fields = FoodSerializer.requested_fields(self.request)
+        if fields is not None:
+            foods = foods.only('id', *(set(fields) & {field.name for field in Food._meta.concrete_fields}))
+        return foods
+
+    @method_decorator(condition(etag_func=_menu_etag, last_modified_func=_menu_modified))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class FoodDetailAPIView(generics.RetrieveAPIView):
+    queryset = Food.objects.all()
+    serializer_class = FoodSerializer
+    lookup_url_kwarg = 'food_id'
+
+    @method_decorator(condition(etag_func=_food_etag, last_modified_func=_food_modified))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class CartAPIView(APIView):
+    """The customer's cart with its lines and their foods; empty if there is none yet."""
+
+    @method_decorator(condition(etag_func=_cart_etag))
+    def get(self, request):
+        items = Prefetch('items', queryset=CartItem.objects.select_related('food').order_by('id'))
+        cart = Cart.objects.filter(customer=request.user).prefetch_related(items).first()
+        if cart is None:
+            return Response({'id': None, 'subtotal': 0, 'item_count': 0, 'items': []})
+        return Response(CartSerializer(cart, context={'request': request}).data)
+
+
+class OrderListAPIView(generics.ListAPIView):
+    serializer_class = OrderSerializer
+    pagination_class = OrderCursorPagination
+
+    def get_queryset(self):
+        orders = Order.objects.filter(customer=self.request.user)
+        fields = OrderSerializer.requested_fields(self.request)
+        if fields is None or 'items' in fields:
+            orders = orders.prefetch_related(_order_items())
+        return orders
+
+    @method_decorator(condition(etag_func=_orders_etag))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class OrderDetailAPIView(generics.RetrieveAPIView):
+    serializer_class = OrderSerializer
+    lookup_url_kwarg = 'order_id'
+
+    def get_queryset(self):
+        return Order.objects.filter(customer=self.request.user).prefetch_related(_order_items())
+
+    @method_decorator(condition(etag_func=_order_etag))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
@@ -0,0 +1,165 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entry (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_entry_accessed ON cache_entry (accessed);
+"""
+
+
+class SQLiteCache(BaseCache):
+    """Cross-process cache in a standalone SQLite file; no server to run.
+
+    Every gunicorn worker opens the same file, so entries written by one
+    worker are seen by all. The file is kept in WAL mode, which lets readers
+    carry on while another worker writes.
+
+    Eviction is least-recently-used. It keeps at most ``MAX_ENTRIES`` rows
+    and ``MAX_SIZE`` bytes of pickled values. Reads refresh an entry's access
+    time only once per ``ACCESS_RESOLUTION`` seconds, so hot keys do not turn
+    every read into a write. The limits are enforced every ``CULL_EVERY``
+    writes per connection, and eviction goes down to ``1 - 1/CULL_FREQUENCY``
+    of each limit.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = str(location)
+        self._max_size = options.get('MAX_SIZE', 64 * 2 ** 20)
+        self._cull_every = options.get('CULL_EVERY', 100)
+        self._access_resolution = options.get('ACCESS_RESOLUTION', 60)
+        self._local = threading.local()
+
+    # ---------------------- Connection ----------------------
+
+    def _connection(self):
+        local = self._local
+        # A connection must not cross a fork (e.g. gunicorn --preload).
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self._path, timeout=10, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            local.connection, local.pid, local.writes = connection, os.getpid(), 0
+        return local.connection
+
+    def _wrote(self, connection):
+        self._local.writes += 1
+        if self._local.writes % self._cull_every == 0:
+            self._cull(connection)
+
+    def _cull(self, connection, now=None):
+        now = time.time() if now is None else now
+        keep = 1 - 1 / self._cull_frequency if self._cull_frequency else 0
+        connection.execute('DELETE FROM cache_entry WHERE expires <= ?', (now,))
+        total_size, total_entries = connection.execute(
+            'SELECT COALESCE(SUM(size), 0), COUNT(*) FROM cache_entry'
+        ).fetchone()
+        if total_size <= self._max_size and total_entries <= self._max_entries:
+            return
+        # Keep the most recently used rows that fit under both reduced limits.
+        connection.execute(
+            """
+            DELETE FROM cache_entry WHERE key IN (
+                SELECT key FROM (
+                    SELECT key,
+                           SUM(size) OVER recent AS running_size,
+                           ROW_NUMBER() OVER recent AS position
+                    FROM cache_entry
+                    WINDOW recent AS (ORDER BY accessed DESC, key)
+                )
+                WHERE running_size > ? OR position > ?
+            )
+            """,
+            (int(self._max_size * keep), int(self._max_entries * keep)),
+        )
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    # ---------------------- Cache API ----------------------
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        now = time.time()
+        row = connection.execute(
+            'SELECT value, expires, accessed FROM cache_entry WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return default
+        value, expires, accessed = row
+        if expires is not None and expires <= now:
+            connection.execute('DELETE FROM cache_entry WHERE key = ? AND expires <= ?', (key, now))
+            return default
+        if now - accessed > self._access_resolution:
+            connection.execute('UPDATE cache_entry SET accessed = ? WHERE key = ?', (now, key))
+        return pickle.loads(value)
+
+    def _store(self, key, value, timeout, only_if_missing):
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        connection = self._connection()
+        on_conflict = 'WHERE cache_entry.expires <= excluded.accessed' if only_if_missing else ''
+        cursor = connection.execute(
+            f"""
+            INSERT INTO cache_entry (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                value = excluded.value, size = excluded.size,
+                expires = excluded.expires, accessed = excluded.accessed
+            {on_conflict}
+            """,
+            (key, payload, len(payload), self.get_backend_timeout(timeout), now),
+        )
+        self._wrote(connection)
+        return cursor.rowcount > 0
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._store(self._key(key, version), value, timeout, only_if_missing=False)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._store(self._key(key, version), value, timeout, only_if_missing=True)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        cursor = self._connection().execute(
+            'UPDATE cache_entry SET expires = ?, accessed = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        cursor = self._connection().execute('DELETE FROM cache_entry WHERE key = ?', (key,))
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entry')
+
+    def close(self, **kwargs):
+        # Connections are reused across requests; nothing to do per request.
+        pass
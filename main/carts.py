@@ -0,0 +1,48 @@
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from main.models import Cart, CartItem
+from main.reservations import hold_lines
+
+
+def refresh_totals(cart_ids):
+    """Recompute the stored subtotal and item count of the given carts in one UPDATE."""
+    lines = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    Cart.objects.filter(pk__in=cart_ids).update(
+        subtotal=Coalesce(Subquery(lines.annotate(total=Sum(F('food__price') * F('quantity'))).values('total')), 0),
+        item_count=Coalesce(Subquery(lines.annotate(count=Sum('quantity')).values('count')), 0),
+    )
+
+
+def _upsert_lines(cart, quantities):
+    """Add ``{food_id: quantity}`` to the cart's lines in a single INSERT ... ON CONFLICT."""
+    table = connection.ops.quote_name(CartItem._meta.db_table)
+    values = ', '.join(['(%s, %s, %s, 0)'] * len(quantities))
+    params = [value for food_id, quantity in quantities.items() for value in (cart.pk, food_id, quantity)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (cart_id, food_id, quantity, held) VALUES {values} "
+            f"ON CONFLICT (cart_id, food_id) DO UPDATE SET quantity = {table}.quantity + excluded.quantity "
+            f"RETURNING id, food_id, quantity, held",
+            params,
+        )
+        rows = cursor.fetchall()
+    return [
+        CartItem(id=item_id, cart=cart, food_id=food_id, quantity=quantity, held=held)
+        for item_id, food_id, quantity, held in rows
+    ]
+
+
+def add_lines(cart, quantities):
+    """Add ``{food_id: quantity}`` to ``cart``, hold the stock and refresh the totals.
+
+    All or nothing: InsufficientStock for any food rolls the whole call back.
+    Returns the affected CartItems.
+    """
+    with transaction.atomic():
+        items = _upsert_lines(cart, quantities)
+        # The upsert locked the lines, so the held values it returned are current.
+        hold_lines(items)
+        refresh_totals([cart.pk])
+    return items
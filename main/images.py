@@ -0,0 +1,70 @@
+import os
+
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Widths (px) of the derivatives generated for every food image.
+VARIANT_WIDTHS = (200, 400, 800)
+
+# Extension -> (Pillow format, save options).
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def variant_name(name, width, extension):
+    """``food_images/pizza.jpg`` -> ``food_images/pizza.w400.webp``, next to the original."""
+    stem, _ = os.path.splitext(name)
+    return f'{stem}.w{width}.{extension}'
+
+
+def render_variants(source_path, widths=VARIANT_WIDTHS):
+    """Write every width/format derivative of ``source_path`` beside it.
+
+    Widths larger than the original are skipped so images are never upscaled.
+    Works on plain paths only, so it can run in a worker process.
+    Returns the widths that now exist.
+    """
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGBA').convert('RGB')
+        generated = []
+        for width in sorted(widths):
+            if width > image.width and generated:
+                break
+            height = round(image.height * min(width, image.width) / image.width)
+            resized = image.resize((min(width, image.width), height), Image.LANCZOS)
+            for extension, (fmt, options) in VARIANT_FORMATS.items():
+                resized.save(variant_name(source_path, width, extension), fmt, **options)
+            generated.append(width)
+    return generated
+
+
+def update_variants(food, force=False):
+    """Generate derivatives for ``food.image`` unless they are already current."""
+    name = food.image.name if food.image else ''
+    if not force and food.image_variants.get('source') == name:
+        return food.image_variants
+    variants = {'source': name, 'widths': []}
+    if name:
+        try:
+            variants['widths'] = render_variants(default_storage.path(name))
+        except (OSError, ValueError):
+            # Missing or unreadable upload: templates fall back to the original.
+            pass
+    type(food).objects.filter(pk=food.pk).update(image_variants=variants)
+    food.image_variants = variants
+    return variants
+
+
+def srcset(food, extension):
+    """``srcset`` attribute value for ``food``'s derivatives in ``extension``."""
+    widths = food.image_variants.get('widths') if food.image_variants else None
+    if not widths or food.image_variants.get('source') != food.image.name:
+        return ''
+    return ', '.join(
+        f'{default_storage.url(variant_name(food.image.name, width, extension))} {width}w'
+        for width in widths
+    )
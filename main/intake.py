@@ -0,0 +1,218 @@
+import fcntl
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from main.models import CartItem, Food, InsufficientStock, Order, OrderItem
+from main.recommendations import record_order
+from main.reservations import claim_holds, sell
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS intake_ticket (
+    id INTEGER PRIMARY KEY,
+    reference TEXT NOT NULL UNIQUE,
+    customer_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    error TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS intake_ticket_status ON intake_ticket (status, id);
+"""
+
+logger = logging.getLogger('main.intake')
+
+QUEUED = 'queued'
+REJECTED = 'rejected'
+
+# Rejected tickets stay readable on the status page for this long.
+REJECTED_TTL = 24 * 3600
+
+
+class StaleCart(Exception):
+    """The cart items a ticket was taken from are gone, e.g. a repeated checkout."""
+
+
+def enabled():
+    return getattr(settings, 'ORDER_INTAKE_QUEUE', False)
+
+
+def _connect():
+    """Open the queue file: WAL, so enqueueing never waits on the writer's reads.
+
+    ``synchronous=NORMAL`` keeps every ticket across a crash of any process;
+    only an OS crash or power loss can drop the last few.
+    """
+    connection = sqlite3.connect(str(settings.ORDER_INTAKE_PATH), timeout=20)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def enqueue(customer, cart_items, address, total_price, discount_amount, discount_code):
+    """Queue a validated checkout and return its reference right away."""
+    reference = uuid.uuid4().hex
+    payload = {
+        'address': address,
+        'total_price': str(total_price),
+        'discount_amount': str(discount_amount),
+        'discount_code': discount_code or None,
+        'cart_items': [item.id for item in cart_items],
+        'quantities': [[item.food_id, item.quantity] for item in cart_items],
+    }
+    connection = _connect()
+    try:
+        with connection:
+            connection.execute(
+                'INSERT INTO intake_ticket (reference, customer_id, payload, created) VALUES (?, ?, ?, ?)',
+                (reference, customer.pk, json.dumps(payload), time.time()),
+            )
+    finally:
+        connection.close()
+    return reference
+
+
+def ticket_status(reference, customer):
+    """``(status, error)`` of a ticket that has not become an order, or ``None`` if unknown."""
+    connection = _connect()
+    try:
+        return connection.execute(
+            'SELECT status, error FROM intake_ticket WHERE reference = ? AND customer_id = ?',
+            (reference, customer.pk),
+        ).fetchone()
+    finally:
+        connection.close()
+
+
+def _check_lines(customer_id, payload):
+    """Raise StaleCart unless every enqueued cart line is still there with the enqueued quantity."""
+    enqueued = {item_id: quantity for item_id, (_, quantity) in zip(payload['cart_items'], payload['quantities'])}
+    current = dict(
+        CartItem.objects.filter(id__in=enqueued, cart__customer_id=customer_id).values_list('id', 'quantity')
+    )
+    if current != enqueued:
+        raise StaleCart('Your cart changed before this order was placed.')
+
+
+def commit_batch(tickets):
+    """Turn queued tickets into orders in one transaction on the main database.
+
+    Each ticket gets a savepoint, so a ticket that runs out of stock, whose
+    cart changed since it was queued, or that fails for any other reason is
+    rejected alone while the rest of the batch commits. ``intake_reference``
+    makes a replay after a crash skip tickets that were already committed.
+    Returns ``(committed references, {reference: error})``.
+    """
+    committed, rejected = [], {}
+    with transaction.atomic():
+        references = [reference for reference, _, _ in tickets]
+        done = set(Order.objects.filter(intake_reference__in=references).values_list('intake_reference', flat=True))
+        food_ids = {food_id for _, _, payload in tickets for food_id, _ in payload['quantities']}
+        foods = Food.objects.in_bulk(food_ids)
+
+        for reference, customer_id, payload in tickets:
+            if reference in done:
+                committed.append(reference)
+                continue
+            quantities = {}
+            for food_id, quantity in payload['quantities']:
+                quantities[food_id] = quantities.get(food_id, 0) + quantity
+            try:
+                with transaction.atomic():
+                    _check_lines(customer_id, payload)
+                    held = claim_holds(payload['cart_items'])
+                    CartItem.objects.filter(id__in=payload['cart_items']).delete()
+                    # Same fixed order as CheckoutView.place_order.
+                    for food_id in sorted(quantities):
+                        if food_id not in foods:
+                            raise StaleCart('An item in your cart is no longer on the menu.')
+                        sell(foods[food_id], quantities[food_id], released=held.get(food_id, 0))
+                    order = Order.objects.create(
+                        customer_id=customer_id,
+                        address=payload['address'],
+                        total_price=Decimal(payload['total_price']),
+                        discount_amount=Decimal(payload['discount_amount']),
+                        discount_code=payload['discount_code'],
+                        intake_reference=reference,
+                    )
+                    OrderItem.objects.bulk_create(
+                        OrderItem(order=order, food_id=food_id, quantity=quantity)
+                        for food_id, quantity in quantities.items()
+                    )
+                    record_order(order)
+            except (InsufficientStock, StaleCart) as error:
+                rejected[reference] = str(error)
+                continue
+            except Exception:
+                # Rejecting it keeps the writer from failing on the same ticket forever.
+                logger.exception('Order intake ticket %s failed', reference)
+                rejected[reference] = 'This order could not be placed. Please try again.'
+                continue
+            committed.append(reference)
+    return committed, rejected
+
+
+def process(batch_size=200, connection=None):
+    """Commit the oldest queued tickets; returns how many were handled."""
+    own = connection is None
+    connection = connection or _connect()
+    try:
+        rows = connection.execute(
+            'SELECT reference, customer_id, payload FROM intake_ticket WHERE status = ? ORDER BY id LIMIT ?',
+            (QUEUED, batch_size),
+        ).fetchall()
+        if not rows:
+            return 0
+        committed, rejected = commit_batch([
+            (reference, customer_id, json.loads(payload)) for reference, customer_id, payload in rows
+        ])
+        # The orders are durable now; a crash before this point replays harmlessly.
+        with connection:
+            connection.executemany('DELETE FROM intake_ticket WHERE reference = ?', [(r,) for r in committed])
+            connection.executemany(
+                'UPDATE intake_ticket SET status = ?, error = ?, created = ? WHERE reference = ?',
+                [(REJECTED, error, time.time(), reference) for reference, error in rejected.items()],
+            )
+            connection.execute(
+                'DELETE FROM intake_ticket WHERE status = ? AND created < ?', (REJECTED, time.time() - REJECTED_TTL)
+            )
+        return len(rows)
+    finally:
+        if own:
+            connection.close()
+
+
+def ticket_count(status=QUEUED):
+    connection = _connect()
+    try:
+        return connection.execute('SELECT COUNT(*) FROM intake_ticket WHERE status = ?', (status,)).fetchone()[0]
+    finally:
+        connection.close()
+
+
+def run_writer(batch_size=200, idle_sleep=0.05, stop=None):
+    """Single-writer loop; an exclusive lock file keeps a second writer out.
+
+    ``stop`` is an optional callable checked while the queue is empty.
+    """
+    with open(f'{settings.ORDER_INTAKE_PATH}.lock', 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise RuntimeError('Another order intake writer is already running.') from None
+        connection = _connect()
+        try:
+            while True:
+                if not process(batch_size, connection):
+                    if stop is not None and stop():
+                        return
+                    time.sleep(idle_sleep)
+        finally:
+            connection.close()
@@ -0,0 +1,277 @@
+import json
+import platform
+import random
+import time
+from collections import Counter
+from decimal import Decimal
+from io import StringIO
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from main.carts import refresh_totals
+from main.middleware import QueryRecorder
+from main.models import Address, Cart, CartItem, Food, FoodRating, Order, OrderItem, User
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database with a deterministic dataset, drive the customer, "
+        "employee and manager flows through the test client and report per-route latency "
+        "and query counts as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--scale', type=int, default=1, help="Dataset size multiplier.")
+        parser.add_argument('--iterations', type=int, default=50, help="Requests per route.")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+        parser.add_argument('--compare', help="Previous JSON report to print p50/p95 changes against.")
+        parser.add_argument('--session-engine', default=settings.SESSION_ENGINE,
+                            help="SESSION_ENGINE to run with, e.g. django.contrib.sessions.backends.db "
+                                 "to compare against database-only sessions.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        settings.DEBUG = False
+        settings.SESSION_ENGINE = options['session_engine']
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.random = random.Random(options['seed'])
+            started = time.perf_counter()
+            self.seed(options['scale'])
+            seed_seconds = time.perf_counter() - started
+            routes = self.run_routes(options['iterations'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'seed': options['seed'],
+                'scale': options['scale'],
+                'iterations': options['iterations'],
+                'seed_seconds': round(seed_seconds, 2),
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'session_engine': options['session_engine'],
+            },
+            'routes': routes,
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output)
+            self.stderr.write(f"Report written to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare']) as handle:
+                self.compare(json.load(handle)['routes'], routes)
+
+    # ---------------------- Dataset ----------------------
+
+    def seed(self, scale):
+        rng = self.random
+        password = make_password('benchmark')
+
+        self.manager = User.objects.create(
+            username='bench_manager', password=password, is_staff=True, is_superuser=True, role=User.MANAGER
+        )
+        self.employee = User.objects.create(username='bench_employee', password=password, role=User.EMPLOYEE)
+        self.employee.groups.add(Group.objects.get_or_create(name='Employee')[0])
+
+        User.objects.bulk_create(
+            [User(username=f'bench_customer_{index}', password=password) for index in range(500 * scale)],
+            batch_size=1000,
+        )
+        self.customers = list(User.objects.filter(username__startswith='bench_customer_').order_by('id'))
+        Address.objects.bulk_create(
+            [Address(customer=customer, title='Home', address=f'Street{customer.id}', city='Tehran',
+                     postal_code='1234567890', is_default=True)
+             for customer in self.customers],
+            batch_size=1000,
+        )
+        self.addresses = dict(Address.objects.values_list('customer_id', 'id'))
+
+        categories = [key for key, _ in Food.CATEGORY_CHOICES]
+        Food.objects.bulk_create(
+            [Food(name=f'Dish {index}', description=f'Benchmark dish number {index}',
+                  price=rng.randint(5, 60), category=rng.choice(categories),
+                  stock=10 ** 6, created_by=self.manager)
+             for index in range(100 * scale)],
+            batch_size=1000,
+        )
+        self.foods = list(Food.objects.order_by('id'))
+
+        orders = []
+        for _ in range(2000 * scale):
+            status = rng.choices(['completed', 'pending', 'cancelled'], weights=[80, 15, 5])[0]
+            orders.append(Order(customer=rng.choice(self.customers), address='-', status=status,
+                                total_price=Decimal(0)))
+        Order.objects.bulk_create(orders, batch_size=1000)
+        order_ids = list(Order.objects.values_list('id', flat=True))
+        OrderItem.objects.bulk_create(
+            [OrderItem(order_id=order_id, food=food, quantity=rng.randint(1, 3))
+             for order_id in order_ids
+             for food in rng.sample(self.foods, rng.randint(1, 4))],
+            batch_size=2000,
+        )
+
+        ratings = {}
+        for _ in range(3000 * scale):
+            key = (rng.choice(self.foods).id, rng.choice(self.customers).id)
+            ratings[key] = FoodRating(food_id=key[0], user_id=key[1], rating=rng.randint(1, 5), comment='-')
+        FoodRating.objects.bulk_create(ratings.values(), batch_size=2000)
+        self.quiet('rebuild_ratings')
+        self.quiet('rebuild_popularity')
+        self.quiet('rebuild_sales_rollup')
+        self.quiet('rebuild_recommendations')
+        self.quiet('rebuild_search_index')
+        self.quiet('rebuild_similar_foods')
+
+        for customer in self.customers[:50]:
+            cart = Cart.objects.create(customer=customer)
+            CartItem.objects.bulk_create(
+                [CartItem(cart=cart, food=food, quantity=1) for food in rng.sample(self.foods, 3)]
+            )
+        refresh_totals(Cart.objects.values('pk'))
+
+    def quiet(self, command):
+        call_command(command, stdout=StringIO())
+
+    # ---------------------- Flows ----------------------
+
+    def client_for(self, user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def run_routes(self, iterations):
+        rng = self.random
+        customer = self.customers[0]
+        food = self.foods[0]
+        order = Order.objects.filter(customer=customer).first()
+        customer_client = self.client_for(customer)
+        employee_client = self.client_for(self.employee)
+        manager_client = self.client_for(self.manager)
+
+        routes = [
+            ('customer_food_list', customer_client, 'get', None, None),
+            ('customer_food_detail', customer_client, 'get', {'food_id': food.id}, None),
+            ('customer_food_search', customer_client, 'get', None, {'q': 'dish 4'}),
+            ('customer_dashboard', customer_client, 'get', None, None),
+            ('customer_cart_detail', customer_client, 'get', None, None),
+            ('customer_order_list', customer_client, 'get', None, None),
+            ('customer_checkout', customer_client, 'get', None, None),
+            ('employee_dashboard', employee_client, 'get', None, None),
+            ('order_pending_list', employee_client, 'get', None, None),
+            ('order_completed_list', employee_client, 'get', None, None),
+            ('manager_dashboard', manager_client, 'get', None, None),
+            ('food_list', manager_client, 'get', None, None),
+            ('food_detail', manager_client, 'get', {'food_id': food.id}, None),
+            ('order_list', manager_client, 'get', None, None),
+            ('top_selling_foods', manager_client, 'get', None, None),
+        ]
+        if order:
+            routes += [
+                ('customer_order_detail', customer_client, 'get', {'order_id': order.id}, None),
+                ('order_detail', manager_client, 'get', {'pk': order.id}, None),
+            ]
+
+        results = {}
+        for url_name, client, method, kwargs, data in routes:
+            url = reverse(url_name, kwargs=kwargs)
+            results[url_name] = self.measure(
+                iterations, lambda: getattr(client, method)(url, data)
+            )
+
+        buyers = [self.client_for(buyer) for buyer in self.customers[50:50 + iterations]]
+        adding_buyers = iter(buyers)
+        results['customer_add_to_cart'] = self.measure(
+            len(buyers),
+            lambda: next(adding_buyers).post(
+                reverse('customer_add_to_cart', kwargs={'food_id': rng.choice(self.foods).id}), {'quantity': 1}
+            ),
+        )
+        checkout_buyers = iter(zip(buyers, self.customers[50:50 + iterations]))
+        results['customer_checkout_post'] = self.measure(
+            len(buyers),
+            lambda: self.checkout(*next(checkout_buyers)),
+        )
+
+        pending = iter(Order.objects.filter(status='pending').values_list('id', flat=True)[:iterations])
+        results['order_complete'] = self.measure(
+            min(iterations, Order.objects.filter(status='pending').count()),
+            lambda: employee_client.post(reverse('order_complete', kwargs={'pk': next(pending)})),
+        )
+        return results
+
+    def checkout(self, client, customer):
+        return client.post(reverse('customer_checkout'), {'address_id': self.addresses[customer.id]})
+
+    def measure(self, iterations, request):
+        timings = []
+        queries = []
+        statuses = Counter()
+        for _ in range(iterations):
+            with QueryRecorder() as recorder:
+                started = time.perf_counter()
+                response = request()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(recorder.count)
+            statuses[response.status_code] += 1
+
+        timings.sort()
+        total_seconds = sum(timings) / 1000
+        return {
+            'requests': iterations,
+            'p50_ms': round(percentile(timings, 0.50), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'mean_ms': round(sum(timings) / iterations, 3) if iterations else 0.0,
+            'throughput_rps': round(iterations / total_seconds, 1) if total_seconds else 0.0,
+            'queries': {
+                'min': min(queries, default=0),
+                'max': max(queries, default=0),
+                'mean': round(sum(queries) / iterations, 2) if iterations else 0.0,
+            },
+            'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        }
+
+    def compare(self, before, after):
+        self.stderr.write(f"{'route':<28}{'p50 ms':>18}{'p95 ms':>18}{'queries':>14}")
+        for url_name in sorted(after):
+            if url_name not in before:
+                continue
+            old, new = before[url_name], after[url_name]
+            self.stderr.write(
+                f"{url_name:<28}"
+                f"{self.change(old['p50_ms'], new['p50_ms']):>18}"
+                f"{self.change(old['p95_ms'], new['p95_ms']):>18}"
+                f"{old['queries']['mean']:>6} -> {new['queries']['mean']:<5}"
+            )
+
+    @staticmethod
+    def change(old, new):
+        if not old:
+            return f"{new:.2f}"
+        return f"{new:.2f} ({(new - old) / old * 100:+.0f}%)"
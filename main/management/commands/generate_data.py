@@ -0,0 +1,286 @@
+import json
+import os
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.timezone import now
+
+from main.carts import refresh_totals
+from main.models import (
+    Address, Cart, CartItem, CommentReply, Food, FoodRating, Order, OrderItem, User
+)
+from main.search import index_foods
+
+# Share of the menu and of the orders each category gets.
+CATEGORY_WEIGHTS = {
+    'kebab': 30,
+    'irani': 25,
+    'pizza': 18,
+    'burger': 14,
+    'strips': 8,
+    'salad': 5,
+}
+
+# Every generated username and food name starts with this.
+PREFIX = 'synthetic_'
+
+STAGES = ('foods', 'users', 'orders', 'ratings', 'carts')
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Let bulk_create keep the dates we generate instead of stamping now()."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a large, skewed synthetic dataset into the database in fixed-size chunks. "
+        "Every chunk is derived from --seed and its index, so an interrupted run resumes "
+        "from the progress file and produces the same rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--foods', type=int, default=300)
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--orders', type=int, default=1_000_000)
+        parser.add_argument('--ratings', type=int, default=300_000, help="Approximate number of ratings.")
+        parser.add_argument('--carts', type=int, default=20_000)
+        parser.add_argument('--days', type=int, default=730, help="Spread orders over this many past days.")
+        parser.add_argument('--chunk-size', type=int, default=5_000)
+        parser.add_argument('--progress', default='generate_data.progress.json')
+        parser.add_argument('--restart', action='store_true', help="Ignore an existing progress file.")
+        parser.add_argument('--skip-rebuild', action='store_true',
+                            help="Do not rebuild rating and popularity aggregates afterwards.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.config = {
+            key: options[key]
+            for key in ('seed', 'foods', 'users', 'orders', 'ratings', 'carts', 'days', 'chunk_size')
+        }
+        self.progress = self.load_progress()
+        self.password = make_password('synthetic')
+        self.owner = User.objects.filter(is_superuser=True).order_by('id').first() or User.objects.create(
+            username=f'{PREFIX}manager', password=self.password,
+            is_staff=True, is_superuser=True, role=User.MANAGER,
+        )
+        # Keep the time axis fixed across resumed runs.
+        self.progress.setdefault('end', now().isoformat())
+        self.end = datetime.fromisoformat(self.progress['end'])
+
+        for stage in STAGES:
+            total = self.stage_total(stage)
+            chunks = -(-total // options['chunk_size'])
+            if stage != 'foods':
+                self.load_lookups()
+            for chunk in range(self.progress['stages'].get(stage, 0), chunks):
+                started = time.perf_counter()
+                rng = random.Random(f"{options['seed']}:{stage}:{chunk}")
+                start = chunk * options['chunk_size']
+                stop = min(total, start + options['chunk_size'])
+                with transaction.atomic():
+                    created = getattr(self, f'generate_{stage}')(rng, start, stop)
+                self.progress['stages'][stage] = chunk + 1
+                self.save_progress()
+                self.stdout.write(
+                    f"{stage}: chunk {chunk + 1}/{chunks}, {created} rows in {time.perf_counter() - started:.2f}s"
+                )
+
+        if not options['skip_rebuild']:
+            for command in (
+                'rebuild_ratings', 'rebuild_popularity', 'rebuild_sales_rollup',
+                'rebuild_recommendations', 'rebuild_similar_foods',
+            ):
+                call_command(command, stdout=StringIO())
+        self.stdout.write(self.style.SUCCESS("Synthetic dataset complete."))
+
+    # ---------------------- Progress ----------------------
+
+    def load_progress(self):
+        path = self.options['progress']
+        if os.path.exists(path) and not self.options['restart']:
+            with open(path) as handle:
+                progress = json.load(handle)
+            if progress['config'] != self.config:
+                raise CommandError(
+                    f"{path} was written with different options {progress['config']}; "
+                    "pass the same options or --restart."
+                )
+            return progress
+        return {'config': self.config, 'stages': {}}
+
+    def save_progress(self):
+        path = self.options['progress']
+        with open(f'{path}.tmp', 'w') as handle:
+            json.dump(self.progress, handle)
+        os.replace(f'{path}.tmp', path)
+
+    def stage_total(self, stage):
+        # Ratings are generated per user, at most one cart per customer.
+        if stage == 'ratings':
+            return self.config['users']
+        if stage == 'carts':
+            return min(self.config['carts'], self.config['users'])
+        return self.config[stage]
+
+    def load_lookups(self):
+        """Load the id lists later stages sample from; ints are kept in compact arrays."""
+        foods = Food.objects.filter(name__startswith=PREFIX).order_by('id')
+        self.food_ids = array('q')
+        self.food_prices = array('q')
+        weights = []
+        for rank, (food_id, price, category) in enumerate(foods.values_list('id', 'price', 'category')):
+            self.food_ids.append(food_id)
+            self.food_prices.append(price)
+            # Zipf-like skew inside the menu, scaled by how popular the category is.
+            weights.append(CATEGORY_WEIGHTS[category] / (rank + 1) ** 0.8)
+        self.food_weights = list(accumulate(weights))
+        users = User.objects.filter(username__startswith=PREFIX, is_superuser=False).order_by('id')
+        self.user_ids = array('q', users.values_list('id', flat=True).iterator(chunk_size=10_000))
+
+    def pick_food(self, rng):
+        """Return an index into the food arrays, skewed towards popular dishes."""
+        return rng.choices(range(len(self.food_ids)), cum_weights=self.food_weights)[0]
+
+    def pick_user(self, rng):
+        # A small core of regulars places most of the orders.
+        return self.user_ids[int(len(self.user_ids) * rng.random() ** 3)]
+
+    # ---------------------- Stages ----------------------
+
+    def generate_foods(self, rng, start, stop):
+        categories = list(CATEGORY_WEIGHTS)
+        weights = list(CATEGORY_WEIGHTS.values())
+        foods = Food.objects.bulk_create([
+            Food(
+                name=f'{PREFIX}food_{index}',
+                description=f'Synthetic dish {index}',
+                price=rng.randint(3, 60),
+                category=rng.choices(categories, weights)[0],
+                stock=rng.randint(0, 500),
+                preparation_time=rng.choice([10, 15, 20, 30, 45, 60]),
+                created_by=self.owner,
+            )
+            for index in range(start, stop)
+        ])
+        # bulk_create skips the post_save receiver that keeps the search index in step.
+        index_foods(foods)
+        return stop - start
+
+    def generate_users(self, rng, start, stop):
+        joined = self.end - timedelta(days=self.config['days'])
+        users = User.objects.bulk_create([
+            User(
+                username=f'{PREFIX}{index:09d}',
+                password=self.password,
+                first_name='Synthetic',
+                last_name=str(index),
+                date_joined=joined + timedelta(seconds=rng.randrange(self.config['days'] * 86400)),
+            )
+            for index in range(start, stop)
+        ])
+        addresses = []
+        for user in users:
+            for number in range(1 if rng.random() < 0.8 else 2):
+                addresses.append(Address(
+                    customer=user,
+                    title='Home' if number == 0 else 'Work',
+                    address=f'Street{rng.randint(1, 999)}No{rng.randint(1, 99)}',
+                    city=rng.choice(['Tehran', 'Isfahan', 'Shiraz', 'Tabriz', 'Mashhad']),
+                    postal_code=f'{rng.randrange(10 ** 10):010d}',
+                    is_default=number == 0,
+                ))
+        Address.objects.bulk_create(addresses)
+        return len(users) + len(addresses)
+
+    def order_moment(self, rng):
+        # Later days are busier (the business grows) and meals cluster around lunch and dinner.
+        days_ago = int(self.config['days'] * (1 - rng.random() ** 0.6))
+        hour = rng.choices([12, 13, 14, 19, 20, 21, rng.randrange(24)], weights=[3, 4, 2, 3, 4, 2, 2])[0]
+        moment = self.end - timedelta(days=days_ago)
+        return moment.replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60))
+
+    def generate_orders(self, rng, start, stop):
+        orders, lines = [], []
+        for _ in range(start, stop):
+            moment = min(self.order_moment(rng), self.end)
+            if self.end - moment < timedelta(hours=2):
+                status = 'pending'
+            else:
+                status = 'cancelled' if rng.random() < 0.05 else 'completed'
+            picks = {self.pick_food(rng) for _ in range(rng.choices([1, 2, 3, 4, 5], [35, 30, 20, 10, 5])[0])}
+            items = [(index, rng.choices([1, 2, 3], [70, 22, 8])[0]) for index in picks]
+            total = sum(self.food_prices[index] * quantity for index, quantity in items)
+            orders.append(Order(
+                customer_id=self.pick_user(rng), address='Synthetic address', order_date=moment,
+                status=status, total_price=Decimal(total),
+            ))
+            lines.append(items)
+
+        with explicit_dates(Order._meta.get_field('order_date')):
+            orders = Order.objects.bulk_create(orders)
+        OrderItem.objects.bulk_create([
+            OrderItem(order_id=order.id, food_id=self.food_ids[index], quantity=quantity)
+            for order, items in zip(orders, lines)
+            for index, quantity in items
+        ])
+        return len(orders)
+
+    def generate_ratings(self, rng, start, stop):
+        mean = self.config['ratings'] / max(1, self.config['users'])
+        ratings = []
+        for user_id in self.user_ids[start:stop]:
+            count = min(len(self.food_ids), round(rng.expovariate(1 / mean)) if mean else 0)
+            foods = {self.pick_food(rng) for _ in range(count)}
+            for index in foods:
+                created = self.end - timedelta(seconds=rng.randrange(self.config['days'] * 86400))
+                ratings.append(FoodRating(
+                    food_id=self.food_ids[index], user_id=user_id,
+                    rating=rng.choices([1, 2, 3, 4, 5], [5, 7, 18, 35, 35])[0],
+                    comment=rng.choice([None, '', 'Delicious', 'Too salty', 'Arrived cold', 'Will order again']),
+                    created_at=created, updated_at=created,
+                ))
+        fields = FoodRating._meta.get_field('created_at'), FoodRating._meta.get_field('updated_at')
+        with explicit_dates(*fields):
+            ratings = FoodRating.objects.bulk_create(ratings)
+        replies = [
+            CommentReply(rating_id=rating.id, user=self.owner, reply='Thank you for your feedback!')
+            for rating in ratings
+            if rating.comment and rng.random() < 0.3
+        ]
+        CommentReply.objects.bulk_create(replies)
+        return len(ratings) + len(replies)
+
+    def generate_carts(self, rng, start, stop):
+        step = max(1, len(self.user_ids) // max(1, self.config['carts']))
+        carts = Cart.objects.bulk_create([
+            Cart(customer_id=self.user_ids[(index * step) % len(self.user_ids)])
+            for index in range(start, stop)
+        ])
+        items = [
+            CartItem(cart_id=cart.id, food_id=self.food_ids[index], quantity=rng.randint(1, 3))
+            for cart in carts
+            for index in {self.pick_food(rng) for _ in range(rng.randint(1, 4))}
+        ]
+        CartItem.objects.bulk_create(items)
+        refresh_totals([cart.id for cart in carts])
+        return len(carts) + len(items)
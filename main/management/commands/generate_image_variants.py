@@ -0,0 +1,47 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from main.images import render_variants
+from main.models import Food
+
+
+def _render(name, path):
+    try:
+        return name, render_variants(path), None
+    except (OSError, ValueError) as error:
+        return name, [], str(error)
+
+
+class Command(BaseCommand):
+    help = "Backfill resized WebP/JPEG variants for every food image using a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--force', action='store_true', help="Regenerate variants that look current.")
+
+    def handle(self, *args, **options):
+        pending = {}
+        for food_id, name, variants in Food.objects.values_list('id', 'image', 'image_variants').iterator():
+            if name and (options['force'] or (variants or {}).get('source') != name):
+                pending.setdefault(name, []).append(food_id)
+
+        done = failed = 0
+        # Several foods can share one upload; each file is rendered once.
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [pool.submit(_render, name, default_storage.path(name)) for name in pending]
+            for future in as_completed(futures):
+                name, widths, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f"{name}: {error}")
+                Food.objects.filter(id__in=pending[name]).update(
+                    image_variants={'source': name, 'widths': widths}
+                )
+                done += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {done} image(s), {failed} failed."
+        ))
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main import intake
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the single writer that commits queued checkouts in batches. "
+        "Only useful with ORDER_INTAKE_QUEUE = True."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help="Tickets committed per transaction.")
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit instead of polling.")
+
+    def handle(self, *args, **options):
+        if not settings.ORDER_INTAKE_QUEUE:
+            self.stderr.write("ORDER_INTAKE_QUEUE is off; checkouts are not being queued.")
+        try:
+            intake.run_writer(
+                batch_size=options['batch_size'],
+                stop=(lambda: True) if options['once'] else None,
+            )
+        except RuntimeError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS("Order intake queue drained."))
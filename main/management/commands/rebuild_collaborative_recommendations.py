@@ -0,0 +1,25 @@
+import json
+import resource
+
+from django.core.management.base import BaseCommand
+
+from main.collaborative import BATCH_SIZE, rebuild_collaborative
+from main.recommendations import RECOMMENDATION_LIMIT
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild customers' recommendation lists with an item-item cosine model over their "
+        "ratings and orders, and report build time and memory as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Customers per dense block.")
+        parser.add_argument('--limit', type=int, default=RECOMMENDATION_LIMIT, help="Foods kept per customer.")
+
+    def handle(self, *args, **options):
+        stats = rebuild_collaborative(options['batch_size'], options['limit'])
+        stats['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(json.dumps(
+            {key: round(value, 2) if isinstance(value, float) else value for key, value in stats.items()}, indent=2
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.popularity import rebuild_popularity
+
+
+class Command(BaseCommand):
+    help = "Recompute the time-decayed popularity score of every food from completed orders."
+
+    def handle(self, *args, **options):
+        count = rebuild_popularity()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt popularity for {count} food(s)."))
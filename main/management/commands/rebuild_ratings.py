@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils.timezone import now
+
+from main.models import Food, FoodRating
+
+
+class Command(BaseCommand):
+    help = "Rebuild every food's rating aggregates from FoodRating and report drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        totals = {
+            row['food']: (row['total'], row['count'])
+            for row in FoodRating.objects.values('food').annotate(total=Sum('rating'), count=Count('id'))
+        }
+
+        drifted = []
+        for food in Food.objects.only('id', 'name', 'rating', 'rating_sum', 'rating_count').iterator():
+            total, count = totals.get(food.id, (Decimal('0'), 0))
+            rating = (Decimal(total) / count).quantize(Decimal('0.01')) if count else Decimal('0.00')
+            if (food.rating_sum, food.rating_count, food.rating) != (total, count, rating):
+                self.stdout.write(
+                    f"{food.name} (#{food.id}): sum {food.rating_sum} -> {total}, "
+                    f"count {food.rating_count} -> {count}, rating {food.rating} -> {rating}"
+                )
+                food.rating_sum, food.rating_count, food.rating = total, count, rating
+                drifted.append(food)
+
+        if drifted and not options['dry_run']:
+            # updated_at moves too, so the food's cached pages and API ETags change.
+            modified = now()
+            for food in drifted:
+                food.updated_at = modified
+            with transaction.atomic():
+                Food.objects.bulk_update(
+                    drifted, ['rating_sum', 'rating_count', 'rating', 'updated_at'], batch_size=500
+                )
+
+        action = "Found" if options['dry_run'] else "Fixed"
+        self.stdout.write(self.style.SUCCESS(f"{action} {len(drifted)} food(s) with drifted ratings."))
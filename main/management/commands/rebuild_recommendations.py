@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Order, User
+from main.recommendations import rebuild_recommendations
+
+
+class Command(BaseCommand):
+    help = "Rebuild the stored recommendation lists from customers' order history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customer', help="Only rebuild the list of this username.")
+
+    def handle(self, *args, **options):
+        customers = User.objects.filter(id__in=Order.objects.values('customer_id'))
+        if options['customer']:
+            customers = User.objects.filter(username=options['customer'])
+
+        count = 0
+        for customer in customers.iterator():
+            rebuild_recommendations(customer)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt recommendations for {count} customer(s)."))
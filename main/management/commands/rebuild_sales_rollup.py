@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+from django.utils.dateparse import parse_date
+from django.utils.timezone import localdate
+
+from main.models import Order
+from main.sales import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = "Backfill the daily food sales rollup from completed orders, one date window at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=parse_date, help="First day to rebuild (YYYY-MM-DD).")
+        parser.add_argument('--end', type=parse_date, help="Last day to rebuild (YYYY-MM-DD).")
+        parser.add_argument('--days-per-chunk', type=int, default=31)
+
+    def handle(self, *args, **options):
+        bounds = Order.objects.filter(status='completed').aggregate(first=Min('order_date'), last=Max('order_date'))
+        if not bounds['first']:
+            self.stdout.write("No completed orders.")
+            return
+        start = options['start'] or localdate(bounds['first'])
+        end = options['end'] or localdate(bounds['last'])
+
+        total = 0
+        for window_start, window_end, rows in rebuild_rollup(start, end, options['days_per_chunk']):
+            total += rows
+            self.stdout.write(f"{window_start} .. {window_end}: {rows} row(s)")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} rollup row(s) from {start} to {end}."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Re-create the full-text menu search index, e.g. after foods were bulk-created or bulk-updated."
+
+    def handle(self, *args, **options):
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} food(s) for search."))
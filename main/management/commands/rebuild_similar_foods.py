@@ -0,0 +1,23 @@
+import resource
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.similarity import BATCH_SIZE, rebuild_similar
+
+
+class Command(BaseCommand):
+    help = "Recompute every food's \"similar dishes\" from TF-IDF vectors of its name and description."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help="Foods compared against the whole menu per matrix product.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild_similar(options['batch_size'])
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt similar dishes for {count} food(s) in {time.perf_counter() - started:.2f}s "
+            f"(peak memory {peak_mb:.0f} MB)."
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from main.reservations import rebuild_reserved, release_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Release cart stock holds whose TTL has lapsed, in bulk. "
+        "Meant to run every minute or so from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Also recompute every Food.reserved counter from the cart lines.")
+
+    def handle(self, *args, **options):
+        released = release_expired()
+        self.stdout.write(self.style.SUCCESS(f"Released {released} held unit(s)."))
+        if options['rebuild']:
+            drifted = rebuild_reserved()
+            self.stdout.write(self.style.SUCCESS(f"Fixed {drifted} food(s) with a drifted reserved counter."))
@@ -0,0 +1,143 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.db.models import Sum
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from main import intake
+from main.models import Address, Food, Order, OrderItem, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Fork several processes that check out concurrently against a throwaway SQLite file, "
+        "the way gunicorn workers do, and report lock errors and stock consistency as JSON. "
+        "Run it with --settings restaurant_project.settings_production to exercise the "
+        "production database profile."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--orders', type=int, default=25, help="Checkouts attempted per process.")
+        parser.add_argument('--stock', type=int, help="Initial stock; defaults to 90%% of the attempts.")
+        parser.add_argument('--intake', action='store_true',
+                            help="Queue checkouts and commit them from one batching writer process.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("stress_checkout only targets SQLite.")
+        attempts = options['processes'] * options['orders']
+        stock = options['stock'] if options['stock'] is not None else attempts * 9 // 10
+
+        setup_test_environment()
+        settings.DEBUG = False
+        directory = tempfile.TemporaryDirectory()
+        # Worker processes cannot share the default in-memory test database.
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(directory.name, 'stress.sqlite3')
+        settings.ORDER_INTAKE_QUEUE = options['intake']
+        settings.ORDER_INTAKE_PATH = os.path.join(directory.name, 'intake.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            customers, food = self.seed(options['processes'], stock)
+            connections.close_all()
+
+            context = multiprocessing.get_context('fork')
+            start = context.Event()
+            results = context.Queue()
+            workers = [
+                context.Process(target=self.worker, args=(customer, food.id, options['orders'], start, results))
+                for customer in customers
+            ]
+            drained = context.Event()
+            writer = context.Process(target=intake.run_writer, kwargs={'stop': drained.is_set})
+            if options['intake']:
+                writer.start()
+            for worker in workers:
+                worker.start()
+            started = time.perf_counter()
+            start.set()
+            outcomes = Counter()
+            for _ in workers:
+                outcomes.update(results.get())
+            for worker in workers:
+                worker.join()
+            # Orders only count once the writer has committed them.
+            drained.set()
+            if options['intake']:
+                writer.join()
+                outcomes['rejected_by_intake'] = intake.ticket_count(intake.REJECTED)
+            seconds = time.perf_counter() - started
+
+            food.refresh_from_db()
+            sold = OrderItem.objects.aggregate(units=Sum('quantity'))['units'] or 0
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+            report = {
+                'processes': options['processes'],
+                'attempts': attempts,
+                'initial_stock': stock,
+                'orders': Order.objects.count(),
+                'units_sold': sold,
+                'remaining_stock': food.stock,
+                'consistent': sold + food.stock == stock,
+                'outcomes': dict(sorted(outcomes.items())),
+                'seconds': round(seconds, 2),
+                'checkouts_per_second': round(attempts / seconds, 1) if seconds else 0.0,
+                'intake_queue': options['intake'],
+                'database': {
+                    'journal_mode': journal_mode,
+                    'transaction_mode': connection.transaction_mode,
+                    'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+                },
+            }
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            directory.cleanup()
+            teardown_test_environment()
+
+        self.stdout.write(json.dumps(report, indent=2))
+        if outcomes['locked'] or not report['consistent']:
+            raise CommandError("Lock errors or an inconsistent stock count; see the report above.")
+
+    def seed(self, processes, stock):
+        password = make_password('stress')
+        manager = User.objects.create(username='stress_manager', password=password, is_superuser=True, is_staff=True)
+        food = Food.objects.create(name='Stress dish', description='-', price=10, stock=stock, created_by=manager)
+        customers = []
+        for index in range(processes):
+            customer = User.objects.create(username=f'stress_customer_{index}', password=password)
+            address = Address.objects.create(
+                customer=customer, title='Home', address=f'Street{index}', city='Tehran',
+                postal_code='1234567890', is_default=True,
+            )
+            customers.append((customer, address.id))
+        return customers, food
+
+    @staticmethod
+    def worker(customer, food_id, orders, start, results):
+        user, address_id = customer
+        outcomes = Counter()
+        client = Client()
+        client.force_login(user)
+        start.wait()
+        for _ in range(orders):
+            try:
+                client.post(reverse('customer_add_to_cart', kwargs={'food_id': food_id}), {'quantity': 1})
+                response = client.post(reverse('customer_checkout'), {'address_id': address_id})
+                outcomes['redirected' if response.status_code == 302 else f'status_{response.status_code}'] += 1
+            except OperationalError as error:
+                outcomes['locked' if 'locked' in str(error) else 'operational_error'] += 1
+        connections.close_all()
+        results.put(dict(outcomes))
@@ -0,0 +1,77 @@
+import hashlib
+
+from django.db import connection
+from django.db.models import Count, Max, Sum
+from django.utils.http import quote_etag
+
+from main.models import FoodRating, MenuVersion, Recommendation
+
+# Writing any food column the menu pages show, however it is done (save,
+# F() update, bulk_create, raw SQL), bumps the food's category in
+# MenuVersion from the triggers migration 0034 installs, so reading the
+# stamp is one tiny query. Changing the shown columns needs a new migration.
+
+
+def _enabled():
+    return connection.vendor == 'sqlite'
+
+
+def menu_stamp(category=None):
+    """``(version, updated_at)`` of one category's foods, or of the whole menu.
+
+    ``None`` on databases without the triggers, where pages are always
+    rendered in full.
+    """
+    if not _enabled():
+        return None
+    versions = MenuVersion.objects.filter(category=category) if category else MenuVersion.objects.all()
+    stamp = versions.aggregate(version=Sum('version'), updated_at=Max('updated_at'))
+    return stamp['version'] or 0, stamp['updated_at']
+
+
+def request_menu_stamp(request, category=None):
+    """menu_stamp, read once per request; condition() asks for the ETag and Last-Modified separately."""
+    stamps = request.__dict__.setdefault('_menu_stamps', {})
+    if category not in stamps:
+        stamps[category] = menu_stamp(category)
+    return stamps[category]
+
+
+def recommendations_stamp(customer):
+    # record_order and the rebuilds all write updated_at, and a shorter list changes the count.
+    stamp = Recommendation.objects.filter(customer=customer).aggregate(count=Count('id'), updated_at=Max('updated_at'))
+    return stamp['count'], stamp['updated_at']
+
+
+def page_etag(request, stamp, *parts):
+    """ETag of a page rendered from the menu at ``stamp`` and the user's ``parts``.
+
+    Folds in what every page varies on besides its data: the URL with its
+    query, the user the navigation is drawn for, and the CSRF secret the
+    page's form tokens are derived from, which changes at login.
+    """
+    if stamp is None:
+        return None
+    user = request.user
+    key = (stamp, parts, request.get_full_path(), user.pk, user.is_superuser, request.META.get('CSRF_COOKIE'))
+    return quote_etag(hashlib.md5(repr(key).encode()).hexdigest())
+
+
+def food_list_etag(request, *args, **kwargs):
+    return page_etag(request, request_menu_stamp(request, request.GET.get('category') or None))
+
+
+def food_list_modified(request, *args, **kwargs):
+    stamp = request_menu_stamp(request, request.GET.get('category') or None)
+    return stamp and stamp[1]
+
+
+def customer_food_list_etag(request, *args, **kwargs):
+    # Recommendations come from every category, so the whole menu counts.
+    return page_etag(request, menu_stamp(), recommendations_stamp(request.user))
+
+
+def customer_food_detail_etag(request, food_id):
+    # The similar dishes come from anywhere on the menu.
+    rating = FoodRating.objects.filter(food_id=food_id, user=request.user).values_list('updated_at', flat=True)
+    return page_etag(request, menu_stamp(), rating.first())
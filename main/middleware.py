@@ -0,0 +1,86 @@
+import logging
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger('main.query_budget')
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def fingerprint(sql):
+    """Collapse literals so queries differing only by values compare equal."""
+    return _LITERALS.sub('?', sql)
+
+
+def query_budget_for(url_name):
+    return settings.QUERY_BUDGETS.get(url_name, settings.QUERY_BUDGET_DEFAULT)
+
+
+class QueryRecorder:
+    """Count and time every query run on the default connection."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    @property
+    def duplicates(self):
+        return {sql: seen for sql, seen in self.fingerprints.items() if seen > 1}
+
+
+class QueryBudgetMiddleware:
+    """Record queries per request and flag requests over their URL's budget.
+
+    Enabled with ``QUERY_BUDGET_ENABLED``. Outside production (``DEBUG``)
+    the figures are also returned as ``X-Query-*`` response headers.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        url_name = match.url_name if match else None
+        duplicates = recorder.duplicates
+        if settings.DEBUG:
+            response['X-Query-Count'] = recorder.count
+            response['X-Query-Duplicates'] = sum(duplicates.values()) - len(duplicates)
+            response['X-Query-Time-Ms'] = f'{recorder.duration * 1000:.1f}'
+
+        budget = query_budget_for(url_name)
+        if recorder.count > budget:
+            worst = sorted(duplicates.items(), key=lambda item: -item[1])[:3]
+            logger.warning(
+                '%s %s (%s) ran %d queries in %.1f ms, budget is %d. Most repeated: %s',
+                request.method, request.path, url_name, recorder.count,
+                recorder.duration * 1000, budget, worst,
+            )
+        return response
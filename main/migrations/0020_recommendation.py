@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0019_commentreply_delete_foodcomment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to=settings.AUTH_USER_MODEL)),
+                ('food', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='main.food')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer', '-score'], name='recommendation_customer_score')],
+                'unique_together': {('customer', 'food')},
+            },
+        ),
+    ]
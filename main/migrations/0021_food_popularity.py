@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0020_recommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='popularity',
+            field=models.FloatField(db_index=True, default=0.0),
+        ),
+    ]
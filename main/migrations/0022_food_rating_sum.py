@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:44
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_sum(apps, schema_editor):
+    Food = apps.get_model('main', 'Food')
+    FoodRating = apps.get_model('main', 'FoodRating')
+    totals = FoodRating.objects.values('food').annotate(total=Sum('rating'), count=Count('id'))
+    for row in totals:
+        Food.objects.filter(pk=row['food']).update(
+            rating_sum=row['total'],
+            rating_count=row['count'],
+            rating=round(row['total'] / row['count'], 2),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0021_food_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='rating_sum',
+            field=models.DecimalField(decimal_places=1, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_rating_sum, migrations.RunPython.noop),
+    ]
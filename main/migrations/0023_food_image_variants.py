@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0022_food_rating_sum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0023_food_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyFoodSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('food', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='main.food')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'food'], name='daily_sales_date_food')],
+                'unique_together': {('food', 'date')},
+            },
+        ),
+    ]
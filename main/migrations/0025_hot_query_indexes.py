@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0024_dailyfoodsales'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='discount',
+            index=models.Index(fields=['code', 'is_active', 'expires_at'], name='discount_code_active'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['category', 'rating'], name='food_category_rating'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['category', 'price'], name='food_category_price'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'order_date', 'id'], name='order_customer_date'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'order_date', 'id'], name='order_status_date'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_date', 'id'], name='order_date'),
+        ),
+    ]
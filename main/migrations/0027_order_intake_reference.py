@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 07:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0026_user_role_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='intake_reference',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-17 07:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0027_order_intake_reference'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='held',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cartitem',
+            name='held_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='reserved',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='cartitem',
+            index=models.Index(fields=['held_until'], name='cartitem_held_until'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.4 on 2026-10-17 07:13
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    """Fold extra carts into each customer's oldest one and same-food lines into one line."""
+    Cart = apps.get_model('main', 'Cart')
+    CartItem = apps.get_model('main', 'CartItem')
+    for row in Cart.objects.values('customer').annotate(carts=Count('id'), keep=Min('id')).filter(carts__gt=1):
+        extra = Cart.objects.filter(customer=row['customer']).exclude(pk=row['keep'])
+        CartItem.objects.filter(cart__in=extra).update(cart=row['keep'])
+        extra.delete()
+    lines = CartItem.objects.values('cart', 'food').annotate(
+        lines=Count('id'), keep=Min('id'), quantity_sum=Sum('quantity'), held_sum=Sum('held'),
+    )
+    for row in lines.filter(lines__gt=1):
+        CartItem.objects.filter(pk=row['keep']).update(quantity=row['quantity_sum'], held=row['held_sum'])
+        CartItem.objects.filter(cart=row['cart'], food=row['food']).exclude(pk=row['keep']).delete()
+
+
+def backfill_totals(apps, schema_editor):
+    Cart = apps.get_model('main', 'Cart')
+    CartItem = apps.get_model('main', 'CartItem')
+    totals = CartItem.objects.values('cart').annotate(
+        subtotal=Sum(F('food__price') * F('quantity')), item_count=Sum('quantity'),
+    )
+    for row in totals:
+        Cart.objects.filter(pk=row['cart']).update(subtotal=row['subtotal'], item_count=row['item_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0028_stock_holds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('customer',), name='cart_one_per_customer'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'food'), name='cartitem_one_per_food'),
+        ),
+    ]
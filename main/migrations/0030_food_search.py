@@ -0,0 +1,57 @@
+import re
+
+from django.db import migrations
+
+# Frozen copies of main.search as of this migration, so later changes there
+# cannot change what replaying it creates.
+TABLE = 'main_food_search'
+INDEXED_FIELDS = ('name', 'description', 'category')
+
+SCHEMA = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    f"name, description, category, tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3')",
+    f"INSERT INTO {TABLE} ({TABLE}, rank) VALUES ('rank', 'bm25(10.0, 1.0, 0.0)')",
+]
+
+_LETTERS = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'ٱ': 'ا', 'ؤ': 'و',
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+})
+_IGNORED = re.compile('[\u064B-\u065F\u0670\u0640\u200c]')
+
+
+def normalize(text):
+    return _IGNORED.sub('', (text or '').translate(_LETTERS)).casefold()
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Food = apps.get_model('main', 'Food')
+    with schema_editor.connection.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, name, description, category) VALUES (%s, %s, %s, %s)',
+            [(pk, normalize(name), normalize(description), category)
+             for pk, name, description, category in Food.objects.values_list('pk', *INDEXED_FIELDS).iterator()],
+        )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0029_cart_totals_and_uniqueness'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-17 07:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0030_food_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarFood',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('food', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_foods', to='main.food')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='main.food')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['food', '-score'], name='similarfood_food_score')],
+                'unique_together': {('food', 'similar')},
+            },
+        ),
+    ]
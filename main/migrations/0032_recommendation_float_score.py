@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0031_similar_foods'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recommendation',
+            name='score',
+            field=models.FloatField(default=0),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-17 07:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0032_recommendation_float_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['category', 'updated_at'], name='food_category_updated'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.4 on 2026-10-17 07:56
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count
+
+# Frozen copy of the triggers in main.menu as of this migration, so later
+# changes there cannot change what replaying it creates.
+_BUMP = (
+    "INSERT INTO main_menuversion (category, version, updated_at) "
+    "SELECT {row}.category, 1, strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE {condition} "
+    "ON CONFLICT (category) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;"
+)
+
+TRIGGERS = {
+    'main_food_menu_insert': (
+        f"AFTER INSERT ON main_food BEGIN {_BUMP.format(row='NEW', condition='1')} END"
+    ),
+    'main_food_menu_update': (
+        "AFTER UPDATE OF name, description, price, image, image_variants, category, "
+        "stock, reserved, rating, rating_count, preparation_time ON main_food BEGIN "
+        f"{_BUMP.format(row='NEW', condition='1')} "
+        f"{_BUMP.format(row='OLD', condition='OLD.category != NEW.category')} END"
+    ),
+    'main_food_menu_delete': (
+        f"AFTER DELETE ON main_food BEGIN {_BUMP.format(row='OLD', condition='1')} END"
+    ),
+}
+
+
+def install_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Food = apps.get_model('main', 'Food')
+    MenuVersion = apps.get_model('main', 'MenuVersion')
+    MenuVersion.objects.bulk_create([
+        MenuVersion(category=row['category'], version=row['count'])
+        for row in Food.objects.values('category').annotate(count=Count('id')).order_by()
+    ])
+    with schema_editor.connection.cursor() as cursor:
+        for name, body in TRIGGERS.items():
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'CREATE TRIGGER {name} {body}')
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            for name in TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0033_food_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=50, unique=True)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RenameField(
+            model_name='foodrating',
+            old_name='modified_at',
+            new_name='updated_at',
+        ),
+        migrations.RunPython(install_triggers, drop_triggers),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-17 08:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0034_menu_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100, unique=True)),
+                ('document_frequency', models.PositiveIntegerField()),
+                ('idf', models.FloatField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 08:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0035_similarity_terms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='credited_revenue',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True),
+        ),
+    ]
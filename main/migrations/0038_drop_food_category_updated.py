@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 08:58
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0037_order_updated_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='food',
+            name='food_category_updated',
+        ),
+    ]
@@ -1,4 +1,9 @@
+import base64
+import json
+
+from django.db.models import Q
 from django.shortcuts import redirect
+from django.utils.dateparse import parse_datetime
 from django.contrib.auth.mixins import AccessMixin
 from django.urls import reverse_lazy
 
@@ -28,3 +33,81 @@ class LoggedOutOnlyMixin(AccessMixin):
 #     def handle_no_permission(self):
 #         return redirect('home')
     
+
+
+class KeysetPaginationMixin:
+    """Paginate a ListView on ``(order_date, id)``, newest first, with opaque cursors.
+
+    Every page costs one indexed range scan, however deep it is, and rows
+    inserted while someone pages never shift or repeat entries. Set
+    ``keyset_descending = False`` to page oldest first.
+    """
+    page_size = 20
+    cursor_param = 'cursor'
+    keyset_field = 'order_date'
+    keyset_descending = True
+
+    def get_paginate_by(self, queryset):
+        return None
+
+    def get_context_data(self, **kwargs):
+        queryset = kwargs.pop('object_list', self.object_list)
+        page = self.paginate_keyset(queryset, self.request.GET.get(self.cursor_param))
+        query = self.request.GET.copy()
+        query.pop(self.cursor_param, None)
+        page['query'] = query.urlencode()
+        page['cursor_param'] = self.cursor_param
+        context = super().get_context_data(object_list=page['object_list'], **kwargs)
+        context['keyset_page'] = page
+        return context
+
+    def paginate_keyset(self, queryset, cursor):
+        field = self.keyset_field
+        position = decode_cursor(cursor)
+        backwards = bool(position) and position['direction'] == 'previous'
+        unfiltered = queryset
+
+        # Walking towards smaller keys: forward on a descending list, backward on an ascending one.
+        downwards = self.keyset_descending != backwards
+        if position:
+            value = parse_datetime(position['value'])
+            lookup = 'lt' if downwards else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'id__{lookup}': position['id']})
+            )
+        ordering = (f'-{field}', '-id') if downwards else (field, 'id')
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        if backwards and not has_more:
+            # Walked back to the start: show a full first page instead of a short one.
+            return self.paginate_keyset(unfiltered, None)
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+
+        return {
+            'object_list': rows,
+            'has_next': backwards or has_more,
+            'has_previous': backwards or bool(position),
+            'next_cursor': encode_cursor(rows[-1], field, 'next') if rows else None,
+            'previous_cursor': encode_cursor(rows[0], field, 'previous') if rows else None,
+        }
+
+
+def encode_cursor(row, field, direction):
+    payload = json.dumps([getattr(row, field).isoformat(), row.id, direction]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the cursor's position, or None for a missing or tampered cursor."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, row_id, direction = json.loads(base64.urlsafe_b64decode(padded))
+        if parse_datetime(value) is None or direction not in ('next', 'previous'):
+            return None
+        return {'value': value, 'id': int(row_id), 'direction': direction}
+    except (ValueError, TypeError):
+        return None
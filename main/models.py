@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Cast, Coalesce, Now, NullIf, Round
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from datetime import timedelta
@@ -22,6 +24,8 @@ class User(AbstractUser):
     ]
 
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default=CUSTOMER)
+    # Bumped whenever group membership changes; invalidates cached roles (see main.roles).
+    role_version = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.username
@@ -30,6 +34,12 @@ class User(AbstractUser):
 # =======================
 #  Food Model
 # =======================
+class InsufficientStock(ValueError):
+    def __init__(self, food):
+        super().__init__(f"Not enough stock available for {food.name}")
+        self.food = food
+
+
 class Food(models.Model):
     CATEGORY_CHOICES = [
         ('irani', 'Irani'),
@@ -44,30 +54,78 @@ class Food(models.Model):
     description = models.TextField()
     price = models.PositiveIntegerField(default=0)
     image = models.ImageField(upload_to='food_images/', default='food_images/default_food.jpg')
+    # Resized derivatives of ``image``, maintained by main.images.
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES, default='irani')
     stock = models.PositiveIntegerField(default=0)
+    # Units held by carts, see main.reservations; available = stock - reserved.
+    reserved = models.PositiveIntegerField(default=0, editable=False)
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.0, blank=True)
     rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.DecimalField(max_digits=12, decimal_places=1, default=0)
     preparation_time = models.PositiveBigIntegerField(default=30)
+    # Time-decayed sales score, see main.popularity for the scale.
+    popularity = models.FloatField(default=0.0, db_index=True)
+    # Last change to what the menu shows; F() updates of shown fields set it too.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'rating'], name='food_category_rating'),
+            models.Index(fields=['category', 'price'], name='food_category_price'),
+        ]
+
+    # Only ever changed with F() updates or by the rebuilds; a stale instance must not write them back.
+    COUNTER_FIELDS = ('reserved', 'rating_sum', 'rating_count', 'rating', 'popularity')
 
     def __str__(self):
         return self.name
 
-    def update_rating(self):
-        ratings = self.ratings.all()
-        if ratings:
-            total_rating = sum(r.rating for r in ratings)
-            self.rating_count = ratings.count()
-            self.rating = total_rating / self.rating_count
-            self.save()
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets a save tell whether the text changed without reading the row again.
+        instance._loaded_text = (instance.__dict__.get('name'), instance.__dict__.get('description'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
-    def reduce_stock(self, quantity):
-        if self.stock >= quantity:
-            self.stock -= quantity
-            self.save()
-        else:
-            raise ValueError("Not enough stock available")
+    @property
+    def available_stock(self):
+        return max(0, self.stock - self.reserved)
+
+    @staticmethod
+    def rating_change(sum_delta, count_delta):
+        """Return UPDATE values that shift the running rating aggregates atomically."""
+        new_sum = F('rating_sum') + sum_delta
+        new_count = F('rating_count') + count_delta
+        average = Cast(new_sum, models.FloatField()) / NullIf(new_count, 0)
+        return {
+            'rating_sum': new_sum,
+            'rating_count': new_count,
+            'rating': Coalesce(Round(average, 2), 0.0, output_field=models.FloatField()),
+            'updated_at': Now(),
+        }
+
+    def reduce_stock(self, quantity, released=0):
+        """Sell ``quantity`` units, turning ``released`` units of the buyer's own holds into the sale.
+
+        Conditional UPDATE, so concurrent buyers can never drive stock below
+        zero or take units other carts hold.
+        """
+        if not Food.objects.filter(pk=self.pk, stock__gte=F('reserved') - released + quantity).update(
+            stock=F('stock') - quantity, reserved=F('reserved') - released, updated_at=Now()
+        ):
+            raise InsufficientStock(self)
+        self.stock -= quantity
+        self.reserved -= released
 
 
 # =======================
@@ -83,10 +141,21 @@ class Order(models.Model):
     customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     address = models.TextField()
     order_date = models.DateTimeField(auto_now_add=True)
+    # Any change to the order or its lines; update() calls set it themselves.
+    updated_at = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     discount_code = models.CharField(max_length=50, blank=True, null=True)
+    # Set when the order came through the intake queue (see main.intake).
+    intake_reference = models.CharField(max_length=32, unique=True, null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'order_date', 'id'], name='order_customer_date'),
+            models.Index(fields=['status', 'order_date', 'id'], name='order_status_date'),
+            models.Index(fields=['order_date', 'id'], name='order_date'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} by {self.customer.username}"
@@ -103,6 +172,9 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     food = models.ForeignKey(Food, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    # What this line added to DailyFoodSales when its order completed, so a
+    # retraction takes back exactly that whatever the price is now; see main.sales.
+    credited_revenue = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, editable=False)
 
     @property
     def total_price(self):
@@ -122,7 +194,7 @@ class FoodRating(models.Model):
     comment = models.TextField(blank=True, null=True)
     reply = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    modified_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ['food', 'user']
@@ -130,6 +202,11 @@ class FoodRating(models.Model):
     def __str__(self):
         return f'{self.user.username} rated {self.food.name} with {self.rating}'
 
+    def save(self, *args, **kwargs):
+        # The food's aggregates move in the save signals; they commit or roll back with the row.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class CommentReply(models.Model):
     rating = models.ForeignKey(FoodRating, related_name='replies', on_delete=models.CASCADE)
@@ -168,6 +245,11 @@ class Discount(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['code', 'is_active', 'expires_at'], name='discount_code_active'),
+        ]
+
     def __str__(self):
         return f"{self.code} - {self.percent}%"
 
@@ -181,19 +263,38 @@ class Discount(models.Model):
 class Cart(models.Model):
     customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Maintained from the cart lines, see main.carts.refresh_totals.
+    subtotal = models.PositiveIntegerField(default=0, editable=False)
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['customer'], name='cart_one_per_customer'),
+        ]
 
     def __str__(self):
         return f"Cart of {self.customer.username}"
 
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.items.all())
+        return self.subtotal
 
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
     food = models.ForeignKey(Food, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    # Units of this line counted in Food.reserved, and when that hold lapses.
+    held = models.PositiveIntegerField(default=0, editable=False)
+    held_until = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'food'], name='cartitem_one_per_food'),
+        ]
+        indexes = [
+            models.Index(fields=['held_until'], name='cartitem_held_until'),
+        ]
 
     @property
     def total_price(self):
@@ -257,3 +358,88 @@ class Address(models.Model):
                 raise ValidationError('You can only have one default address.')
 
         super().clean()
+
+
+# =======================
+#  Menu Version Model
+# =======================
+class MenuVersion(models.Model):
+    """Change counter of one menu category, bumped by triggers on main_food, see main.menu."""
+
+    category = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=now)
+
+    def __str__(self):
+        return f"{self.category} v{self.version}"
+
+
+# =======================
+#  Recommendation Model
+# =======================
+class Recommendation(models.Model):
+    """One row of a customer's bounded top-N recommendation list."""
+
+    customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='recommendations')
+    food = models.ForeignKey(Food, on_delete=models.CASCADE, related_name='recommendations')
+    score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['customer', 'food']
+        indexes = [
+            models.Index(fields=['customer', '-score'], name='recommendation_customer_score'),
+        ]
+
+    def __str__(self):
+        return f"{self.food_id} for {self.customer_id} ({self.score})"
+
+
+class SimilarFood(models.Model):
+    """One of a food's top-k neighbours by TF-IDF cosine similarity of its text."""
+
+    food = models.ForeignKey(Food, on_delete=models.CASCADE, related_name='similar_foods')
+    similar = models.ForeignKey(Food, on_delete=models.CASCADE, related_name='similar_to')
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ['food', 'similar']
+        indexes = [
+            models.Index(fields=['food', '-score'], name='similarfood_food_score'),
+        ]
+
+    def __str__(self):
+        return f"{self.similar_id} like {self.food_id} ({self.score:.3f})"
+
+
+class SimilarityTerm(models.Model):
+    """A word of the TF-IDF vocabulary fitted by the last full rebuild, see main.similarity."""
+
+    term = models.CharField(max_length=100, unique=True)
+    document_frequency = models.PositiveIntegerField()
+    idf = models.FloatField()
+
+    def __str__(self):
+        return f"{self.term} ({self.idf:.3f})"
+
+
+# =======================
+#  Sales Rollup Model
+# =======================
+class DailyFoodSales(models.Model):
+    """Completed sales of one food on one day, maintained by main.sales."""
+
+    food = models.ForeignKey(Food, on_delete=models.CASCADE, related_name='daily_sales')
+    date = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['food', 'date']
+        indexes = [
+            models.Index(fields=['date', 'food'], name='daily_sales_date_food'),
+        ]
+
+    def __str__(self):
+        return f"{self.food_id} on {self.date}: {self.units}"
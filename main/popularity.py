@@ -0,0 +1,63 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from main.models import Food, OrderItem
+
+# A sale counts half as much after this long.
+POPULARITY_HALF_LIFE = timedelta(days=30)
+
+# Reference point for the stored scores. Never change it without rebuilding.
+POPULARITY_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _growth(moment):
+    return 2 ** ((moment - POPULARITY_EPOCH) / POPULARITY_HALF_LIFE)
+
+
+def sale_weight(quantity, moment=None):
+    """Weight of a sale in the stored scale.
+
+    Instead of decaying every score as time passes, new sales are inflated
+    by ``2 ** (t / half_life)``. All foods share the same scale, so ordering
+    by ``Food.popularity`` ranks them by decayed sales without ever
+    rewriting old rows.
+    """
+    return quantity * _growth(moment or now())
+
+
+def decayed_score(food, moment=None):
+    """Return the food's popularity expressed in units sold as of ``moment``."""
+    return food.popularity / _growth(moment or now())
+
+
+def record_completed_order(order, moment=None):
+    """Credit every item of a completed order to its food's popularity."""
+    moment = moment or now()
+    for food_id, quantity in order.items.values_list('food_id', 'quantity'):
+        Food.objects.filter(id=food_id).update(popularity=F('popularity') + sale_weight(quantity, moment))
+
+
+def popular_foods(limit=5):
+    return Food.objects.filter(popularity__gt=0).order_by('-popularity')[:limit]
+
+
+def rebuild_popularity():
+    """Recompute every score from completed orders, dated by ``order_date``."""
+    scores = {}
+    items = (
+        OrderItem.objects.filter(order__status='completed')
+        .values_list('food_id', 'quantity', 'order__order_date')
+    )
+    for food_id, quantity, order_date in items.iterator(chunk_size=2000):
+        scores[food_id] = scores.get(food_id, 0.0) + sale_weight(quantity, order_date)
+
+    foods = [Food(id=food_id, popularity=score) for food_id, score in scores.items() if math.isfinite(score)]
+    # One transaction, so readers never see the zeroed ranking in between.
+    with transaction.atomic():
+        Food.objects.update(popularity=0.0)
+        Food.objects.bulk_update(foods, ['popularity'], batch_size=500)
+    return len(foods)
@@ -0,0 +1,93 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from main.models import Food, OrderItem, Recommendation
+
+# Number of recommendations kept per customer.
+RECOMMENDATION_LIMIT = 10
+
+
+def get_recommendations(customer, limit=RECOMMENDATION_LIMIT):
+    """Read a customer's stored recommendations with one indexed query."""
+    return (
+        Food.objects.filter(recommendations__customer=customer)
+        .order_by('-recommendations__score', '-rating', 'id')[:limit]
+    )
+
+
+@transaction.atomic
+def record_order(order):
+    """Fold a newly placed order into the customer's recommendation list.
+
+    Every category in the order gains affinity weighted by quantity. Foods
+    the customer has just ordered leave the list, a bounded set of fresh
+    candidates from those categories joins it, and the list is trimmed back
+    to ``RECOMMENDATION_LIMIT`` rows.
+    """
+    customer = order.customer
+    weights = Counter()
+    ordered_ids = set()
+    for food_id, category, quantity in order.items.values_list('food_id', 'food__category', 'quantity'):
+        weights[category] += quantity
+        ordered_ids.add(food_id)
+    if not weights:
+        return
+
+    stored = Recommendation.objects.filter(customer=customer)
+    stored.filter(food_id__in=ordered_ids).delete()
+    for category, weight in weights.items():
+        stored.filter(food__category=category).update(score=F('score') + weight, updated_at=now())
+
+    candidates = (
+        Food.objects.filter(category__in=weights)
+        .exclude(id__in=stored.values('food_id'))
+        .exclude(id__in=OrderItem.objects.filter(order__customer=customer).values('food_id'))
+        .order_by('-rating', 'id')
+        .values_list('id', 'category')[:RECOMMENDATION_LIMIT]
+    )
+    Recommendation.objects.bulk_create(
+        [Recommendation(customer=customer, food_id=food_id, score=weights[category])
+         for food_id, category in candidates],
+        ignore_conflicts=True,
+    )
+    _trim(customer)
+
+
+@transaction.atomic
+def rebuild_recommendations(customer):
+    """Recompute a customer's list from their full order history."""
+    weights = Counter()
+    ordered_ids = set()
+    items = OrderItem.objects.filter(order__customer=customer)
+    for food_id, category, quantity in items.values_list('food_id', 'food__category', 'quantity'):
+        weights[category] += quantity
+        ordered_ids.add(food_id)
+
+    Recommendation.objects.filter(customer=customer).delete()
+    if not weights:
+        return
+
+    candidates = (
+        Food.objects.filter(category__in=weights)
+        .exclude(id__in=ordered_ids)
+        .values_list('id', 'category', 'rating')
+    )
+    ranked = sorted(candidates, key=lambda row: (-weights[row[1]], -row[2], row[0]))
+    Recommendation.objects.bulk_create([
+        Recommendation(customer=customer, food_id=food_id, score=weights[category])
+        for food_id, category, _ in ranked[:RECOMMENDATION_LIMIT]
+    ])
+
+
+def _trim(customer):
+    overflow = (
+        Recommendation.objects.filter(customer=customer)
+        .order_by('-score', '-food__rating', 'food_id')
+        .values_list('id', flat=True)[RECOMMENDATION_LIMIT:]
+    )
+    overflow = list(overflow)
+    if overflow:
+        Recommendation.objects.filter(id__in=overflow).delete()
@@ -0,0 +1,108 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import F
+from django.utils.dateparse import parse_date
+from django.utils.timezone import make_aware
+
+from main.models import Order
+
+# Rows fetched per round-trip while streaming an export.
+EXPORT_CHUNK_SIZE = 2000
+
+CSV_HEADER = [
+    'order_id', 'order_date', 'status', 'customer', 'order_total', 'discount_amount', 'discount_code',
+    'food_id', 'food', 'category', 'unit_price', 'quantity', 'line_total',
+]
+
+
+def parse_day(value):
+    """The date in a ``YYYY-MM-DD`` query parameter, or ``None`` when it is missing or no real day."""
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+def filtered_orders(params):
+    """Orders matching the report's ``status``, ``start_date`` and ``end_date`` query parameters.
+
+    Both dates are inclusive days in the current time zone, compared as a
+    half-open range of datetimes so the ``order_date`` index is used.
+    """
+    orders = Order.objects.all()
+    if params.get('status'):
+        orders = orders.filter(status=params['status'])
+    start_date = parse_day(params.get('start_date'))
+    end_date = parse_day(params.get('end_date'))
+    if start_date:
+        orders = orders.filter(order_date__gte=_midnight(start_date))
+    if end_date:
+        orders = orders.filter(order_date__lt=_midnight(end_date + timedelta(days=1)))
+    return orders
+
+
+def _midnight(day):
+    return make_aware(datetime.combine(day, time.min))
+
+
+def export_rows(orders):
+    """Stream one flat tuple per order item, joined with its order, customer and food.
+
+    Read from the orders' side, so an order without items is one row whose
+    item columns are empty.
+    """
+    return (
+        orders.order_by('id', 'items__id')
+        .values_list(
+            'id', 'order_date', 'status', 'customer__username',
+            'total_price', 'discount_amount', 'discount_code',
+            'items__food_id', 'items__food__name', 'items__food__category', 'items__food__price', 'items__quantity',
+        )
+        .annotate(line_total=F('items__food__price') * F('items__quantity'))
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(orders):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in export_rows(orders):
+        yield writer.writerow([value.isoformat() if hasattr(value, 'isoformat') else value for value in row])
+
+
+def jsonl_lines(orders):
+    """One JSON object per order with its items nested, built from consecutive rows."""
+    current = None
+    for row in export_rows(orders):
+        record = dict(zip(CSV_HEADER, row))
+        if current is None or current['order_id'] != record['order_id']:
+            if current is not None:
+                yield _dump(current)
+            current = {key: record[key] for key in CSV_HEADER[:7]}
+            current['items'] = []
+        if record['food_id'] is not None:
+            current['items'].append({key: record[key] for key in CSV_HEADER[7:]})
+    if current is not None:
+        yield _dump(current)
+
+
+def _dump(record):
+    return json.dumps(record, default=_json_default, ensure_ascii=False) + '\n'
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
@@ -0,0 +1,136 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils.timezone import now
+
+from main.models import CartItem, Food, InsufficientStock
+
+# How long an item in a cart keeps its units away from other customers.
+HOLD_TTL = timedelta(minutes=15)
+
+# Expired holds released per transaction by the sweeper.
+SWEEP_BATCH_SIZE = 1000
+
+
+def _reserve_all(units_by_food):
+    """Reserve every food's units or none of them."""
+    delta = Case(
+        *[When(pk=food_id, then=Value(units)) for food_id, units in units_by_food.items()],
+        output_field=IntegerField(),
+    )
+    foods = Food.objects.filter(pk__in=units_by_food, stock__gte=F('reserved') + delta)
+    if len(units_by_food) == 1:
+        return foods.update(reserved=F('reserved') + delta) == 1
+    # A partial update must not survive; a savepoint is cheaper than a check-then-update race.
+    savepoint = transaction.savepoint()
+    if foods.update(reserved=F('reserved') + delta) == len(units_by_food):
+        transaction.savepoint_commit(savepoint)
+        return True
+    transaction.savepoint_rollback(savepoint)
+    return False
+
+
+def _unreserve(units_by_food):
+    """Give held units back to their foods in a single UPDATE."""
+    if not units_by_food:
+        return
+    Food.objects.filter(pk__in=units_by_food).update(reserved=F('reserved') - Case(
+        *[When(pk=food_id, then=Value(units)) for food_id, units in units_by_food.items()],
+        output_field=IntegerField(),
+    ))
+
+
+def hold_lines(items):
+    """Make every cart line hold its whole quantity and restart its TTL.
+
+    ``items`` must carry ``quantity`` and ``held`` as read while their rows
+    were locked, e.g. RETURNING from the upsert in main.carts, so the deltas
+    are exact. Only the differences touch Food.reserved, all foods in one
+    conditional UPDATE. If that falls short, the foods' expired holds are swept
+    and it is tried once more before InsufficientStock is raised. The sweep
+    skips ``items`` themselves: their lapsed holds are what the deltas were
+    computed from. Must run inside a transaction that is rolled back when it
+    propagates.
+    """
+    deltas = {}
+    for item in items:
+        deltas[item.food_id] = deltas.get(item.food_id, 0) + item.quantity - item.held
+    wanted = {food_id: units for food_id, units in deltas.items() if units > 0}
+    if wanted and not _reserve_all(wanted):
+        release_expired(food_ids=list(wanted), exclude_ids=[item.pk for item in items])
+        if not _reserve_all(wanted):
+            raise InsufficientStock(next(
+                food for food in Food.objects.filter(pk__in=wanted).order_by('pk')
+                if food.stock - food.reserved < wanted[food.pk]
+            ))
+    _unreserve({food_id: -units for food_id, units in deltas.items() if units < 0})
+    held_until = now() + HOLD_TTL
+    CartItem.objects.filter(pk__in=[item.pk for item in items]).update(held=F('quantity'), held_until=held_until)
+    for item in items:
+        item.held, item.held_until = item.quantity, held_until
+
+
+def claim_holds(item_ids):
+    """Zero the holds of the given cart lines and return the units they held, per food.
+
+    Callers either sell those units (Food.reduce_stock's ``released``) or give
+    them back (release_holds). Must run inside a transaction.
+    """
+    units_by_food = {}
+    rows = CartItem.objects.select_for_update().filter(id__in=item_ids, held__gt=0).values_list('id', 'food_id', 'held')
+    claimed = []
+    for item_id, food_id, units in rows:
+        units_by_food[food_id] = units_by_food.get(food_id, 0) + units
+        claimed.append(item_id)
+    if claimed:
+        CartItem.objects.filter(id__in=claimed).update(held=0, held_until=None)
+    return units_by_food
+
+
+def sell(food, quantity, released=0):
+    """Food.reduce_stock, sweeping the food's expired holds once before giving up."""
+    try:
+        food.reduce_stock(quantity, released)
+    except InsufficientStock:
+        release_expired(food_ids=[food.pk])
+        food.reduce_stock(quantity, released)
+
+
+def release_holds(item_ids):
+    with transaction.atomic():
+        _unreserve(claim_holds(item_ids))
+
+
+def release_expired(moment=None, food_ids=None, exclude_ids=None, batch_size=SWEEP_BATCH_SIZE):
+    """Release every hold that lapsed by ``moment``, a batch per transaction; returns the units freed."""
+    moment = moment or now()
+    expired = CartItem.objects.filter(held__gt=0, held_until__lte=moment)
+    if food_ids is not None:
+        expired = expired.filter(food_id__in=food_ids)
+    if exclude_ids:
+        expired = expired.exclude(id__in=exclude_ids)
+    released = 0
+    while True:
+        with transaction.atomic():
+            ids = list(expired.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return released
+            units_by_food = claim_holds(ids)
+            _unreserve(units_by_food)
+        released += sum(units_by_food.values())
+        if len(ids) < batch_size:
+            return released
+
+
+def rebuild_reserved():
+    """Recompute every Food.reserved from the cart lines; returns how many foods drifted."""
+    held = dict(
+        CartItem.objects.filter(held__gt=0).values('food_id').annotate(units=Sum('held')).values_list('food_id', 'units')
+    )
+    drifted = 0
+    for food_id, reserved in list(Food.objects.values_list('id', 'reserved')):
+        if reserved != held.get(food_id, 0):
+            Food.objects.filter(pk=food_id).update(reserved=held.get(food_id, 0))
+            drifted += 1
+    return drifted
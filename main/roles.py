@@ -0,0 +1,63 @@
+from django.db.models import F
+
+from main.models import User
+
+# Membership in this auth group is what makes a user an employee.
+EMPLOYEE_GROUP = 'Employee'
+
+SESSION_KEY = '_role'
+
+
+def compute_role(user):
+    """Work out ``(role, in_employee_group)`` from the database; one query at most."""
+    in_group = user.groups.filter(name=EMPLOYEE_GROUP).exists()
+    if user.is_superuser:
+        return User.MANAGER, in_group
+    return (User.EMPLOYEE if in_group else User.CUSTOMER), in_group
+
+
+def role_stamp(user):
+    """Everything a cached role depends on, read from the already loaded user row.
+
+    ``role_version`` is bumped whenever the user's groups change, so a stale
+    session entry never matches again.
+    """
+    return f'{user.pk}:{user.role_version}:{user.is_superuser:d}{user.is_staff:d}:{user.role}'
+
+
+def remember_role(request, user):
+    role, in_group = compute_role(user)
+    request.session[SESSION_KEY] = {'role': role, 'employee': in_group, 'stamp': role_stamp(user)}
+    request._role = role, in_group
+    return request._role
+
+
+def resolve_role(request):
+    """``(role, in_employee_group)`` for ``request.user``.
+
+    Memoised on the request and cached in the session, so only the first
+    request after login or after a group/flag change pays for the query.
+    """
+    if hasattr(request, '_role'):
+        return request._role
+    user = request.user
+    if not user.is_authenticated:
+        request._role = None, False
+        return request._role
+    cached = request.session.get(SESSION_KEY)
+    if cached and cached.get('stamp') == role_stamp(user):
+        request._role = cached['role'], cached['employee']
+        return request._role
+    return remember_role(request, user)
+
+
+def get_role(request):
+    return resolve_role(request)[0]
+
+
+def is_employee(request):
+    return resolve_role(request)[1]
+
+
+def invalidate_roles(user_ids):
+    User.objects.filter(pk__in=user_ids).update(role_version=F('role_version') + 1)
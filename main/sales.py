@@ -0,0 +1,101 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils.timezone import localdate
+
+from main.models import DailyFoodSales, OrderItem
+
+
+def record_status_change(order, old_status):
+    """Keep the daily rollup in step with an order entering or leaving 'completed'."""
+    if old_status != 'completed' and order.status == 'completed':
+        _apply(order, 1)
+    elif old_status == 'completed' and order.status != 'completed':
+        _apply(order, -1)
+
+
+@transaction.atomic
+def _apply(order, sign):
+    day = localdate(order.order_date)
+    totals = defaultdict(lambda: [0, Decimal(0)])
+    items = list(order.items.select_related('food').only('food_id', 'quantity', 'credited_revenue', 'food__price'))
+    for item in items:
+        current = Decimal(item.food.price * item.quantity)
+        if sign > 0:
+            item.credited_revenue = current
+        # Lines completed before credited_revenue existed fall back to today's price.
+        revenue = current if item.credited_revenue is None else item.credited_revenue
+        totals[item.food_id][0] += item.quantity
+        totals[item.food_id][1] += revenue
+        if sign < 0:
+            item.credited_revenue = None
+    OrderItem.objects.bulk_update(items, ['credited_revenue'], batch_size=500)
+
+    for food_id in sorted(totals):
+        units, revenue = totals[food_id]
+        changes = {
+            'units': F('units') + sign * units,
+            'revenue': F('revenue') + sign * revenue,
+            'orders': F('orders') + sign,
+        }
+        rollup = DailyFoodSales.objects.filter(food_id=food_id, date=day)
+        if rollup.update(**changes) or sign < 0:
+            continue
+        try:
+            with transaction.atomic():
+                DailyFoodSales.objects.create(food_id=food_id, date=day, units=units, revenue=revenue, orders=1)
+        except IntegrityError:
+            # Another worker created the row first.
+            rollup.update(**changes)
+
+
+def top_selling(start=None, end=None, limit=10):
+    rows = DailyFoodSales.objects.all()
+    if start:
+        rows = rows.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+    return (
+        rows.values('food_id', 'food__name', 'food__image')
+        .annotate(total_sales=Sum('units'), revenue=Sum('revenue'), order_count=Sum('orders'))
+        .order_by('-total_sales', 'food_id')[:limit]
+    )
+
+
+def rebuild_rollup(start, end, days_per_chunk=31):
+    """Recompute the rollup from completed orders, one date window per transaction.
+
+    Yields ``(window_start, window_end, rows)`` after each window commits.
+    """
+    window_start = start
+    while window_start <= end:
+        window_end = min(end, window_start + timedelta(days=days_per_chunk - 1))
+        with transaction.atomic():
+            DailyFoodSales.objects.filter(date__range=(window_start, window_end)).delete()
+            sales = (
+                OrderItem.objects.filter(
+                    order__status='completed',
+                    order__order_date__date__range=(window_start, window_end),
+                )
+                .annotate(day=TruncDate('order__order_date'))
+                .values('food_id', 'day')
+                .annotate(
+                    units=Sum('quantity'),
+                    revenue=Sum(Coalesce('credited_revenue', F('quantity') * F('food__price'),
+                                         output_field=DecimalField(max_digits=12, decimal_places=2))),
+                    order_count=Count('order_id', distinct=True),
+                )
+                .order_by()
+            )
+            rows = DailyFoodSales.objects.bulk_create(
+                [DailyFoodSales(food_id=row['food_id'], date=row['day'], units=row['units'],
+                                revenue=row['revenue'], orders=row['order_count'])
+                 for row in sales],
+                batch_size=1000,
+            )
+        yield window_start, window_end, len(rows)
+        window_start = window_end + timedelta(days=1)
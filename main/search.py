@@ -0,0 +1,178 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from main.models import Food
+
+# FTS5 table over the normalized name and description; its rowid is Food.id.
+# The category is indexed too, so filtering by it is part of the MATCH.
+TABLE = 'main_food_search'
+INDEXED_FIELDS = ('name', 'description', 'category')
+
+# The name counts ten times as much as the description in the BM25 rank.
+RANK = 'bm25(10.0, 1.0, 0.0)'
+
+SCHEMA = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    f"name, description, category, tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3')",
+    f"INSERT INTO {TABLE} ({TABLE}, rank) VALUES ('rank', '{RANK}')",
+]
+
+AUTOCOMPLETE_LIMIT = 10
+SEARCH_RESULTS_LIMIT = 100
+
+# BM25 first counts every match of every term for its IDF weights, which on a
+# large menu costs more than the search itself. Queries matching more foods
+# than this list name matches first, newest first, instead.
+RANKED_CANDIDATES = 500
+
+# Arabic letter forms to the Persian ones, Persian and Arabic-Indic digits to ASCII.
+_LETTERS = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'ٱ': 'ا', 'ؤ': 'و',
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+})
+# Harakat, the superscript alef, tatweel and the zero-width non-joiner, which
+# is typed inconsistently inside words such as "می‌خورم".
+_IGNORED = re.compile('[\u064B-\u065F\u0670\u0640\u200c]')
+_TOKEN = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Fold the spellings a Persian menu and its customers mix into one form."""
+    return _IGNORED.sub('', (text or '').translate(_LETTERS)).casefold()
+
+
+def tokenize(text):
+    """The normalized words of ``text``, as the index sees them."""
+    return _TOKEN.findall(normalize(text))
+
+
+def match_expression(query, prefix=True, category=None, columns='name description'):
+    """FTS5 MATCH string for free text: all tokens, the last one as a prefix.
+
+    Tokens are quoted, so operators typed by a customer are searched as words.
+    Returns ``None`` when the query has no searchable token.
+    """
+    terms = [f'"{token}"' for token in tokenize(query)]
+    if not terms:
+        return None
+    if prefix:
+        terms[-1] += '*'
+    expression = '{%s}: (%s)' % (columns, ' '.join(terms))
+    if category:
+        expression = '{category}: "%s" AND %s' % (category.replace('"', '""'), expression)
+    return expression
+
+
+def _enabled():
+    return connection.vendor == 'sqlite'
+
+
+def index_foods(foods):
+    """Write the given foods' current name and description into the index."""
+    if not _enabled():
+        return
+    rows = [(food.pk, normalize(food.name), normalize(food.description), food.category) for food in foods]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(f'INSERT INTO {TABLE} (rowid, name, description, category) VALUES (%s, %s, %s, %s)', rows)
+
+
+def unindex_food(food_id):
+    if _enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [food_id])
+
+
+def rebuild_index(batch_size=2000):
+    """Re-create the index table from SCHEMA and fill it from every food; returns the count.
+
+    Run it after bulk_create, or after changing SCHEMA or RANK so existing
+    databases pick up the new table.
+    """
+    if not _enabled():
+        return 0
+    count = 0
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+            for statement in SCHEMA:
+                cursor.execute(statement)
+        batch = []
+        for food in Food.objects.only(*INDEXED_FIELDS).iterator(chunk_size=batch_size):
+            batch.append(food)
+            if len(batch) == batch_size:
+                index_foods(batch)
+                count, batch = count + len(batch), []
+        index_foods(batch)
+        count += len(batch)
+        with connection.cursor() as cursor:
+            # Merge the b-trees the inserts left behind into one.
+            cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return count
+
+
+def search_ids(query, limit=AUTOCOMPLETE_LIMIT, category=None, prefix=True):
+    """Ids of the foods matching ``query``, best BM25 rank first.
+
+    Whether more than RANKED_CANDIDATES foods match is a short walk down the
+    rowids; such broad queries, e.g. a single letter typed into the search
+    box, skip BM25 for the order described at RANKED_CANDIDATES.
+    """
+    expression = match_expression(query, prefix, category)
+    if expression is None:
+        return []
+    if not _enabled():
+        foods = _contains(Food.objects.all(), query)
+        if category:
+            foods = foods.filter(category=category)
+        return list(foods.order_by('name').values_list('pk', flat=True)[:limit])
+    select = f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s'
+    with connection.cursor() as cursor:
+        cursor.execute(f'{select} ORDER BY rowid DESC LIMIT 1 OFFSET %s', [expression, RANKED_CANDIDATES])
+        if cursor.fetchone() is None:
+            cursor.execute(f'{select} ORDER BY rank LIMIT %s', [expression, limit])
+            return [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            f'{select} ORDER BY rowid DESC LIMIT %s',
+            [match_expression(query, prefix, category, columns='name'), limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        if len(ids) < limit:
+            cursor.execute(f'{select} ORDER BY rowid DESC LIMIT %s', [expression, limit + len(ids)])
+            ids += [row[0] for row in cursor.fetchall() if row[0] not in ids][:limit - len(ids)]
+        return ids
+
+
+def ids_with_any(terms, limit):
+    """Ids of up to ``limit`` foods whose name or description has any of the normalized ``terms``."""
+    if not terms:
+        return []
+    if not _enabled():
+        matching = Q()
+        for term in terms:
+            matching |= Q(name__icontains=term) | Q(description__icontains=term)
+        return list(Food.objects.filter(matching).values_list('pk', flat=True)[:limit])
+    expression = '{name description}: (%s)' % ' OR '.join(f'"{term}"' for term in terms)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s LIMIT %s', [expression, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def filter_matching(queryset, query, prefix=True):
+    """Narrow a Food queryset to the foods matching ``query``, in one SQL statement."""
+    expression = match_expression(query, prefix)
+    if expression is None:
+        return queryset
+    if not _enabled():
+        return _contains(queryset, query)
+    return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [expression]))
+
+
+def _contains(queryset, query):
+    # Other databases get an unranked LIKE scan over the raw text.
+    return queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
@@ -0,0 +1,85 @@
+from rest_framework import serializers
+
+from main.models import Cart, CartItem, Food, Order, OrderItem
+
+
+class SparseFieldsMixin:
+    """Serialize only the fields named in ``?fields=a,b``; every field without it.
+
+    ``requested_fields`` is there for views that trim their queries to match,
+    and an unknown name is a 400 rather than being silently dropped.
+    """
+    fields_param = 'fields'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = request.query_params.get(self.fields_param) if request else None
+        if not requested:
+            return
+        names = {name.strip() for name in requested.split(',') if name.strip()}
+        unknown = names - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError({self.fields_param: f"Unknown fields: {', '.join(sorted(unknown))}."})
+        for name in set(self.fields) - names:
+            self.fields.pop(name)
+
+    @classmethod
+    def requested_fields(cls, request):
+        """The fields ``request`` asks for, or ``None`` for all of them."""
+        requested = request.query_params.get(cls.fields_param)
+        if not requested:
+            return None
+        return {name.strip() for name in requested.split(',') if name.strip()}
+
+
+class FoodSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Food
+        fields = [
+            'id', 'name', 'description', 'price', 'category', 'image', 'stock',
+            'rating', 'rating_count', 'preparation_time', 'updated_at',
+        ]
+
+
+class FoodSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Food
+        fields = ['id', 'name', 'price', 'category']
+
+
+class CartItemSerializer(serializers.ModelSerializer):
+    food = FoodSummarySerializer(read_only=True)
+    total_price = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = CartItem
+        fields = ['id', 'food', 'quantity', 'total_price']
+
+
+class CartSerializer(serializers.ModelSerializer):
+    items = CartItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Cart
+        fields = ['id', 'subtotal', 'item_count', 'items']
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    food = FoodSummarySerializer(read_only=True)
+    total_price = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'food', 'quantity', 'total_price']
+
+
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'status', 'order_date', 'updated_at', 'address', 'total_price',
+            'discount_amount', 'discount_code', 'intake_reference', 'items',
+        ]
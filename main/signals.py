@@ -1,19 +1,137 @@
-from django.contrib.auth.signals import user_logged_in
-from django.dispatch import receiver
-from django.contrib.auth.models import User
-from django.conf import settings
+from decimal import Decimal
+from functools import partial
 
-@receiver(user_logged_in)
-def set_user_as_customer(sender, request, user, **kwargs):
-    if user.role != 'customer':
-        user.role = 'customer'
-        user.save()
-from django.db.models.signals import post_save
+from django.contrib.auth.models import Group
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models import Subquery
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import User
+from .carts import refresh_totals
+from .images import update_variants
+from .models import Cart, CartItem, Food, FoodRating, User
+from .reservations import release_holds
+from .roles import invalidate_roles, remember_role
+from .search import INDEXED_FIELDS, index_foods, unindex_food
+from .similarity import update_similar
 
 @receiver(post_save, sender=User)
 def set_user_as_customer(sender, instance, created, **kwargs):
     if created and not instance.role:
         instance.role = User.CUSTOMER  
         instance.save()
+
+
+@receiver(user_logged_in)
+def cache_role_on_login(sender, request, user, **kwargs):
+    remember_role(request, user)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_role_on_group_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_roles([instance.pk])
+            # Keep the in-memory user in step, e.g. for a login right after.
+            instance.role_version += 1
+    elif action == 'pre_clear':
+        # pk_set is not given for clear(); remember who is losing the group.
+        instance._cleared_user_ids = list(instance.user_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        invalidate_roles(instance.__dict__.pop('_cleared_user_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_roles(pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_role_on_group_edit(sender, instance, raw=False, **kwargs):
+    # Renaming or deleting a group can change what its members resolve to.
+    if not raw and not kwargs.get('created'):
+        invalidate_roles(instance.user_set.values('pk'))
+
+
+def retract_stored_rating(rating_pk):
+    # Read the row as it is stored, not as the (possibly stale) instance has it.
+    stored = FoodRating.objects.filter(pk=rating_pk)
+    Food.objects.filter(pk=Subquery(stored.values('food_id')[:1])).update(
+        **Food.rating_change(-Subquery(stored.values('rating')[:1]), -1)
+    )
+
+
+@receiver(pre_save, sender=FoodRating)
+def remember_stored_rating(sender, instance, raw, **kwargs):
+    # Runs inside FoodRating.save's transaction, so the row cannot change before post_save.
+    if not raw and not instance._state.adding:
+        instance._stored_rating = FoodRating.objects.filter(pk=instance.pk).values_list('food_id', 'rating').first()
+
+
+@receiver(post_save, sender=FoodRating)
+def apply_rating_after_save(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    new = Decimal(str(instance.rating))
+    stored = instance.__dict__.pop('_stored_rating', None)
+    if stored and stored[0] == instance.food_id:
+        Food.objects.filter(pk=instance.food_id).update(**Food.rating_change(new - stored[1], 0))
+        return
+    if stored:
+        Food.objects.filter(pk=stored[0]).update(**Food.rating_change(-stored[1], -1))
+    Food.objects.filter(pk=instance.food_id).update(**Food.rating_change(new, 1))
+
+
+@receiver(pre_delete, sender=FoodRating)
+def retract_rating_before_delete(sender, instance, **kwargs):
+    retract_stored_rating(instance.pk)
+
+
+@receiver(post_save, sender=Food)
+def refresh_image_variants(sender, instance, raw, **kwargs):
+    if not raw:
+        update_variants(instance)
+
+
+@receiver(pre_delete, sender=CartItem)
+def release_hold_before_delete(sender, instance, **kwargs):
+    # Also covers cascades from Cart, Food and User deletes.
+    if instance.held:
+        release_holds([instance.pk])
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def refresh_cart_totals(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_totals([instance.cart_id])
+
+
+@receiver(post_save, sender=Food)
+def refresh_carts_after_price_change(sender, instance, created, raw, **kwargs):
+    if not raw and not created:
+        refresh_totals(Cart.objects.filter(items__food=instance).values('pk'))
+
+
+@receiver(post_save, sender=Food)
+def index_food_for_search(sender, instance, update_fields, **kwargs):
+    if update_fields is None or set(INDEXED_FIELDS) & set(update_fields):
+        index_foods([instance])
+
+
+@receiver(post_delete, sender=Food)
+def unindex_deleted_food(sender, instance, **kwargs):
+    unindex_food(instance.pk)
+
+
+@receiver(pre_save, sender=Food)
+def note_text_change(sender, instance, raw, **kwargs):
+    # Food.save writes every field, so compare with the text the instance was loaded with.
+    if not raw:
+        instance._text_changed = getattr(instance, '_loaded_text', None) != (instance.name, instance.description)
+
+
+@receiver(post_save, sender=Food)
+def update_similar_foods(sender, instance, raw, **kwargs):
+    if not raw and instance.__dict__.pop('_text_changed', False):
+        instance._loaded_text = (instance.name, instance.description)
+        # After commit, so the request's transaction never waits on it and a rollback skips it.
+        transaction.on_commit(partial(update_similar, instance.pk), robust=True)
@@ -0,0 +1,196 @@
+import heapq
+from collections import Counter
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Min
+
+from main.models import Food, SimilarFood, SimilarityTerm
+from main.search import ids_with_any, tokenize
+
+# Neighbours kept per food.
+SIMILAR_LIMIT = 6
+
+# Vocabulary cap: the matrix is foods x MAX_FEATURES float32, 16 KB per food.
+MAX_FEATURES = 4096
+
+# A word in the name counts as much as this many in the description.
+NAME_WEIGHT = 2
+
+# Foods whose similarities are computed per matrix product.
+BATCH_SIZE = 512
+
+# An edited food is compared with the foods sharing one of its
+# CANDIDATE_TERMS most weighted (rarest) words, at most CANDIDATE_LIMIT of them.
+CANDIDATE_TERMS = 8
+CANDIDATE_LIMIT = 2000
+
+
+def get_similar(food, limit=SIMILAR_LIMIT):
+    """Read a food's stored neighbours with one indexed query."""
+    return Food.objects.filter(similar_to__food=food).order_by('-similar_to__score', 'id')[:limit]
+
+
+def _document(name, description):
+    return tokenize(name) * NAME_WEIGHT + tokenize(description)
+
+
+def _documents():
+    ids, documents = [], []
+    foods = Food.objects.order_by('pk').values_list('pk', 'name', 'description')
+    for pk, name, description in foods.iterator(chunk_size=2000):
+        ids.append(pk)
+        documents.append(_document(name, description))
+    return ids, documents
+
+
+def fit_vocabulary(documents, max_features=MAX_FEATURES):
+    """``{term: (column, document frequency, idf)}`` of the most common terms, smoothed IDF."""
+    frequencies = Counter(term for document in documents for term in set(document))
+    kept = sorted(
+        ((term, frequency) for term, frequency in frequencies.items()
+         if len(term) <= SimilarityTerm._meta.get_field('term').max_length),
+        key=lambda item: (-item[1], item[0]),
+    )[:max_features]
+    return {
+        term: (column, frequency, float(np.log((1 + len(documents)) / (1 + frequency)) + 1))
+        for column, (term, frequency) in enumerate(kept)
+    }
+
+
+def tfidf_matrix(documents, max_features=MAX_FEATURES, vocabulary=None):
+    """L2-normalized TF-IDF rows for tokenized documents, sublinear TF and smoothed IDF."""
+    if vocabulary is None:
+        vocabulary = fit_vocabulary(documents, max_features)
+    rows, columns, counts = [], [], []
+    for row, document in enumerate(documents):
+        for term, count in Counter(document).items():
+            if term in vocabulary:
+                rows.append(row)
+                columns.append(vocabulary[term][0])
+                counts.append(count)
+
+    idf = np.zeros(len(vocabulary), dtype=np.float32)
+    for column, _, weight in vocabulary.values():
+        idf[column] = weight
+    matrix = np.zeros((len(documents), len(vocabulary)), dtype=np.float32)
+    columns = np.array(columns, dtype=np.int64)
+    matrix[rows, columns] = (1 + np.log(np.array(counts, dtype=np.float32))) * idf[columns]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def sparse_vector(document, idf):
+    """One document's normalized TF-IDF weights as ``{term: weight}``, for ``idf`` as ``{term: idf}``."""
+    weights = {
+        term: (1 + float(np.log(count))) * idf[term]
+        for term, count in Counter(document).items() if term in idf
+    }
+    norm = sum(weight * weight for weight in weights.values()) ** 0.5
+    return {term: weight / norm for term, weight in weights.items()} if norm else {}
+
+
+def top_neighbours(matrix, rows, k=SIMILAR_LIMIT):
+    """``(columns, scores)`` of each given row's k most similar other rows, best first.
+
+    One matrix product for the whole batch; argpartition picks the top k of
+    every row without sorting the rest.
+    """
+    rows = np.asarray(rows)
+    scores = matrix[rows] @ matrix.T
+    scores[np.arange(len(rows)), rows] = -1
+    k = min(k, matrix.shape[0] - 1)
+    if k <= 0:
+        return np.empty((len(rows), 0), dtype=np.int64), np.empty((len(rows), 0), dtype=np.float32)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def _neighbour_rows(ids, matrix, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        columns, scores = top_neighbours(matrix, batch)
+        for row, row_columns, row_scores in zip(batch, columns.tolist(), scores.tolist()):
+            yield from (
+                SimilarFood(food_id=ids[row], similar_id=ids[column], score=score)
+                for column, score in zip(row_columns, row_scores) if score > 0
+            )
+
+
+def rebuild_similar(batch_size=BATCH_SIZE):
+    """Recompute every food's neighbours and the stored vocabulary; returns the number of foods."""
+    ids, documents = _documents()
+    vocabulary = fit_vocabulary(documents)
+    matrix = tfidf_matrix(documents, vocabulary=vocabulary)
+    rows = list(_neighbour_rows(ids, matrix, list(range(len(ids))), batch_size))
+    with transaction.atomic():
+        SimilarFood.objects.all().delete()
+        SimilarFood.objects.bulk_create(rows, batch_size=2000)
+        SimilarityTerm.objects.all().delete()
+        SimilarityTerm.objects.bulk_create([
+            SimilarityTerm(term=term, document_frequency=frequency, idf=idf)
+            for term, (_, frequency, idf) in vocabulary.items()
+        ], batch_size=2000)
+    return len(ids)
+
+
+@transaction.atomic
+def update_similar(food_id, limit=SIMILAR_LIMIT):
+    """Fold a new or edited food into the stored neighbour lists.
+
+    Uses the vocabulary and IDF of the last full rebuild and scores the food
+    against the candidates that share a word with it, so the cost follows
+    those few foods rather than the menu. Its own list is replaced; other
+    lists only gain, re-score or lose this one food. Words the rebuild has
+    not seen are ignored until rebuild_similar_foods runs again.
+    """
+    text = Food.objects.filter(pk=food_id).values_list('name', 'description').first()
+    if text is None:
+        return
+    idf = dict(SimilarityTerm.objects.values_list('term', 'idf'))
+    vector = sparse_vector(_document(*text), idf)
+    terms = heapq.nlargest(CANDIDATE_TERMS, vector, key=vector.get)
+    candidates = [pk for pk in ids_with_any(terms, CANDIDATE_LIMIT + 1) if pk != food_id][:CANDIDATE_LIMIT]
+
+    scores = {}
+    for pk, name, description in Food.objects.filter(pk__in=candidates).values_list('pk', 'name', 'description'):
+        other = sparse_vector(_document(name, description), idf)
+        score = sum(weight * other.get(term, 0) for term, weight in vector.items())
+        if score > 0:
+            scores[pk] = score
+
+    SimilarFood.objects.filter(food_id=food_id).delete()
+    best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+    rows = [SimilarFood(food_id=food_id, similar_id=pk, score=score) for pk, score in best]
+
+    listed = SimilarFood.objects.filter(similar_id=food_id)
+    listed.exclude(food_id__in=list(scores)).delete()
+    stale = list(listed)
+    for row in stale:
+        row.score = scores[row.food_id]
+    SimilarFood.objects.bulk_update(stale, ['score'], batch_size=500)
+
+    already = {row.food_id for row in stale}
+    joining = [pk for pk in scores if pk not in already]
+    floors = {
+        entry['food_id']: (entry['lowest'], entry['count'])
+        for entry in SimilarFood.objects.filter(food_id__in=joining)
+        .values('food_id').annotate(lowest=Min('score'), count=Count('id'))
+    }
+    full = []
+    for pk in joining:
+        lowest, count = floors.get(pk, (0, 0))
+        if count < limit or scores[pk] > lowest:
+            rows.append(SimilarFood(food_id=pk, similar_id=food_id, score=scores[pk]))
+            if count >= limit:
+                full.append(pk)
+
+    weakest = {}
+    for row_id, pk, score in SimilarFood.objects.filter(food_id__in=full).values_list('id', 'food_id', 'score'):
+        if pk not in weakest or score < weakest[pk][1]:
+            weakest[pk] = (row_id, score)
+    SimilarFood.objects.filter(id__in=[row_id for row_id, _ in weakest.values()]).delete()
+    SimilarFood.objects.bulk_create(rows, batch_size=2000)
@@ -1,5 +1,7 @@
 from django import template
 
+from main.images import srcset as image_srcset
+
 register = template.Library()
 
 @register.filter
@@ -8,3 +10,8 @@ def multiply(value, arg):
         return value * arg
     except (TypeError, ValueError):
         return value
+
+
+@register.filter
+def srcset(food, extension='jpg'):
+    return image_srcset(food, extension)
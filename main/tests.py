@@ -1,3 +1,1388 @@
-from django.test import TestCase
+import json
+import os
+import re
+import tempfile
+import threading
+from datetime import datetime, time, timedelta
+from io import StringIO
+from itertools import count
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db.models import F, Q, Sum
+from django.urls import reverse
+from django.utils import timezone
+import numpy as np
+from PIL import Image
+
+from main import intake, urls
+from main.cache import SQLiteCache
+from main.collaborative import ORDER_WEIGHT, RATING_WEIGHT, InteractionMatrix, stream_interactions
+from main.images import VARIANT_WIDTHS, srcset, variant_name
+from main.middleware import query_budget_for
+from main.popularity import (
+    POPULARITY_HALF_LIFE, decayed_score, popular_foods, rebuild_popularity, record_completed_order, sale_weight,
+)
+from main.recommendations import RECOMMENDATION_LIMIT, get_recommendations, rebuild_recommendations, record_order
+from main.reports import filtered_orders
+from main.reservations import HOLD_TTL, release_expired
+from main.sales import record_status_change
+from main.search import search_ids
+from main.views import CartBatchView, CheckoutView
+from main.similarity import get_similar, tfidf_matrix, top_neighbours
+from main.models import (
+    Address, Cart, CartItem, DailyFoodSales, Discount, Employee, Food, FoodRating, MenuVersion, Order, OrderItem,
+    Recommendation, SimilarFood, User,
+)
+
+
+def make_customer(username):
+    customer = User.objects.create_user(username, password='secret')
+    address = Address.objects.create(
+        customer=customer, title='Home', address='Street1234', city='Tehran', postal_code='1234567890'
+    )
+    return customer, address
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.customer, self.address = make_customer('customer')
+        self.pizza = Food.objects.create(name='Pizza', description='-', price=10, stock=5, created_by=self.customer)
+        self.kebab = Food.objects.create(name='Kebab', description='-', price=20, stock=1, created_by=self.customer)
+        self.cart = Cart.objects.create(customer=self.customer)
+        self.client.force_login(self.customer)
+
+    def test_checkout_places_order_and_decrements_stock(self):
+        CartItem.objects.create(cart=self.cart, food=self.pizza, quantity=2)
+        CartItem.objects.create(cart=self.cart, food=self.kebab, quantity=1)
+
+        response = self.client.post(reverse('customer_checkout'), {'address_id': self.address.id})
+
+        self.assertRedirects(response, reverse('customer_order_list'), fetch_redirect_response=False)
+        order = Order.objects.get(customer=self.customer)
+        self.assertEqual(order.total_price, 40)
+        self.assertEqual(order.items.count(), 2)
+        self.assertFalse(self.cart.items.exists())
+        self.pizza.refresh_from_db()
+        self.kebab.refresh_from_db()
+        self.assertEqual((self.pizza.stock, self.kebab.stock), (3, 0))
+
+    def test_insufficient_stock_rolls_back_everything(self):
+        CartItem.objects.create(cart=self.cart, food=self.pizza, quantity=2)
+        CartItem.objects.create(cart=self.cart, food=self.kebab, quantity=2)
+
+        response = self.client.post(reverse('customer_checkout'), {'address_id': self.address.id})
+
+        self.assertRedirects(response, reverse('customer_checkout'), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.count(), 2)
+        self.pizza.refresh_from_db()
+        self.assertEqual(self.pizza.stock, 5)
+
+
+    def place(self, snapshot):
+        view = CheckoutView()
+        view.request = mock.Mock(user=self.customer)
+        with transaction.atomic():
+            return view.place_order(self.cart, snapshot, self.address, 20, 0, '')
+
+    def test_a_repeated_checkout_of_the_same_lines_is_rejected(self):
+        CartItem.objects.create(cart=self.cart, food=self.pizza, quantity=2)
+        # A double submit: both requests read the cart before either places its order.
+        snapshot = list(self.cart.items.select_related('food'))
+        self.place(snapshot)
+        with self.assertRaises(intake.StaleCart):
+            self.place(snapshot)
+        self.assertEqual(Order.objects.count(), 1)
+        self.pizza.refresh_from_db()
+        self.assertEqual(self.pizza.stock, 3)
+
+    def test_changed_quantities_are_rejected(self):
+        CartItem.objects.create(cart=self.cart, food=self.pizza, quantity=2)
+        snapshot = list(self.cart.items.select_related('food'))
+        self.cart.items.update(quantity=4)
+        with self.assertRaises(intake.StaleCart):
+            self.place(snapshot)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.get().quantity, 4)
+        self.pizza.refresh_from_db()
+        self.assertEqual(self.pizza.stock, 5)
+
+class IntakeQueueTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        queue = override_settings(ORDER_INTAKE_QUEUE=True, ORDER_INTAKE_PATH=f'{directory.name}/intake.sqlite3')
+        queue.enable()
+        self.addCleanup(queue.disable)
+        self.customer, self.address = make_customer('customer')
+        self.pizza = Food.objects.create(name='Pizza', description='-', price=10, stock=3, created_by=self.customer)
+        self.cart = Cart.objects.create(customer=self.customer)
+        self.client.force_login(self.customer)
+
+    def checkout(self, quantity, customer=None, food=None):
+        customer, address = customer or (self.customer, self.address)
+        cart, _ = Cart.objects.get_or_create(customer=customer)
+        CartItem.objects.create(cart=cart, food=food or self.pizza, quantity=quantity)
+        self.client.force_login(customer)
+        response = self.client.post(reverse('customer_checkout'), {'address_id': address.id})
+        self.assertEqual(response.status_code, 302)
+        return response['Location']
+
+    def test_queued_checkout_is_committed_by_the_writer(self):
+        status_url = self.checkout(2)
+        self.assertContains(self.client.get(status_url), 'being placed')
+        self.assertFalse(Order.objects.exists())
+
+        self.assertEqual(intake.process(), 1)
+
+        order = Order.objects.get(customer=self.customer)
+        self.assertRedirects(
+            self.client.get(status_url), reverse('customer_order_detail', kwargs={'order_id': order.id}),
+            fetch_redirect_response=False,
+        )
+        self.assertEqual(order.items.get().quantity, 2)
+        self.assertFalse(self.cart.items.exists())
+        self.pizza.refresh_from_db()
+        self.assertEqual(self.pizza.stock, 1)
+
+    def test_tickets_in_one_batch_are_rejected_individually(self):
+        first = self.checkout(2)
+        kebab = Food.objects.create(name='Kebab', description='-', price=20, stock=3, created_by=self.customer)
+        repeated = self.checkout(1, food=kebab)
+        other = make_customer('other')
+        short = self.checkout(2, other)
+        self.assertEqual(intake.process(), 3)
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get(first).status_code, 302)
+        self.assertContains(self.client.get(repeated), 'Your cart changed')
+        self.client.force_login(other[0])
+        self.assertContains(self.client.get(short), 'Not enough stock available for Pizza')
+        self.pizza.refresh_from_db()
+        self.assertEqual(self.pizza.stock, 1)
+
+    def test_line_grown_after_enqueue_rejects_the_ticket(self):
+        status_url = self.checkout(1)
+        CartItem.objects.filter(cart=self.cart).update(quantity=3)
+        intake.process()
+        self.assertContains(self.client.get(status_url), 'Your cart changed')
+        self.assertEqual(CartItem.objects.get(cart=self.cart).quantity, 3)
+        self.assertFalse(Order.objects.exists())
+
+    def test_unexpected_error_rejects_only_its_ticket(self):
+        first = self.checkout(1)
+        other = make_customer('other')
+        second = self.checkout(1, other)
+        with mock.patch('main.intake.record_order', side_effect=[RuntimeError('boom'), None]), \
+                self.assertLogs('main.intake', 'ERROR'):
+            self.assertEqual(intake.process(), 2)
+        self.assertEqual(intake.process(), 0)
+        self.client.force_login(self.customer)
+        self.assertContains(self.client.get(first), 'could not be placed')
+        self.assertEqual(list(Order.objects.values_list('customer', flat=True)), [other[0].pk])
+        self.pizza.refresh_from_db()
+        self.assertEqual(self.pizza.stock, 2)
+
+    def test_checkout_precheck_counts_other_carts_holds(self):
+        other, _ = make_customer('other')
+        Cart.objects.create(customer=other).items.create(food=self.pizza, quantity=2)
+        Food.objects.filter(pk=self.pizza.pk).update(reserved=2)
+        CartItem.objects.create(cart=self.cart, food=self.pizza, quantity=2)
+        response = self.client.post(reverse('customer_checkout'), {'address_id': self.address.id})
+        self.assertRedirects(response, reverse('customer_checkout'), fetch_redirect_response=False)
+        self.assertEqual(intake.ticket_count(), 0)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    buyers = 12
+    stock = 5
+
+    def test_parallel_checkouts_never_oversell(self):
+        owner = User.objects.create_user('owner')
+        food = Food.objects.create(name='Pizza', description='-', price=10, stock=self.stock, created_by=owner)
+        clients = []
+        for index in range(self.buyers):
+            customer, address = make_customer(f'buyer{index}')
+            CartItem.objects.create(cart=Cart.objects.create(customer=customer), food=food, quantity=1)
+            client = Client()
+            client.force_login(customer)
+            clients.append((client, address))
+
+        barrier = threading.Barrier(self.buyers)
+
+        def checkout(client, address):
+            barrier.wait()
+            try:
+                client.post(reverse('customer_checkout'), {'address_id': address.id})
+            except OperationalError:
+                # A writer that could not get the lock simply fails its checkout.
+                pass
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=pair) for pair in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        food.refresh_from_db()
+        sold = sum(OrderItem.objects.filter(food=food).values_list('quantity', flat=True))
+        self.assertGreaterEqual(food.stock, 0)
+        self.assertLessEqual(sold, self.stock)
+        self.assertEqual(sold, self.stock - food.stock)
+        self.assertFalse(Order.objects.filter(items__isnull=True).exists())
+
+
+class StockHoldTests(TestCase):
+    def setUp(self):
+        self.customer, self.address = make_customer('customer')
+        self.rival, _ = make_customer('rival')
+        self.pizza = Food.objects.create(name='Pizza', description='-', price=10, stock=3, created_by=self.customer)
+
+    def add(self, customer, quantity):
+        self.client.force_login(customer)
+        return self.client.post(
+            reverse('customer_add_to_cart', kwargs={'food_id': self.pizza.id}), {'quantity': quantity}
+        )
+
+    def test_holds_keep_units_from_other_carts(self):
+        self.add(self.customer, 2)
+        self.pizza.refresh_from_db()
+        self.assertEqual((self.pizza.reserved, self.pizza.available_stock), (2, 1))
+
+        self.assertRedirects(self.add(self.rival, 2), reverse('customer_food_list'), fetch_redirect_response=False)
+        self.assertFalse(CartItem.objects.filter(cart__customer=self.rival).exists())
+
+        self.client.force_login(self.customer)
+        self.client.post(reverse('customer_checkout'), {'address_id': self.address.id})
+        self.pizza.refresh_from_db()
+        self.assertEqual((self.pizza.stock, self.pizza.reserved), (1, 0))
+
+    def test_expired_holds_are_swept_and_removed_lines_release(self):
+        self.add(self.customer, 3)
+        later = timezone.now() + HOLD_TTL + timedelta(seconds=1)
+        self.assertEqual(release_expired(later), 3)
+        self.pizza.refresh_from_db()
+        self.assertEqual(self.pizza.reserved, 0)
+
+        # The lapsed line can still be checked out while stock lasts.
+        self.add(self.rival, 2)
+        item = CartItem.objects.get(cart__customer=self.rival)
+        self.client.post(reverse('customer_remove_from_cart', kwargs={'item_id': item.id}))
+        self.pizza.refresh_from_db()
+        self.assertEqual(self.pizza.reserved, 0)
+
+    def test_growing_a_lapsed_line_keeps_its_own_hold_counted(self):
+        self.add(self.customer, 2)
+        CartItem.objects.filter(cart__customer=self.customer).update(held_until=timezone.now() - timedelta(seconds=1))
+        self.add(self.rival, 1)
+        self.add(self.customer, 1)
+        self.pizza.refresh_from_db()
+        held = CartItem.objects.aggregate(units=Sum('held'))['units']
+        self.assertEqual((self.pizza.reserved, held), (3, 3))
+        self.assertEqual(CartItem.objects.get(cart__customer=self.customer).quantity, 2)
+
+
+class CartTotalsTests(TestCase):
+    def setUp(self):
+        self.customer, _ = make_customer('customer')
+        self.pizza = Food.objects.create(name='Pizza', description='-', price=10, stock=10, created_by=self.customer)
+        self.kebab = Food.objects.create(name='Kebab', description='-', price=25, stock=10, created_by=self.customer)
+        self.client.force_login(self.customer)
+
+    def add(self, food, quantity):
+        self.client.post(reverse('customer_add_to_cart', kwargs={'food_id': food.id}), {'quantity': quantity})
+
+    def totals(self):
+        return Cart.objects.values_list('subtotal', 'item_count').get(customer=self.customer)
+
+    def test_adding_accumulates_quantities_and_totals(self):
+        self.add(self.pizza, 1)
+        self.add(self.pizza, 2)
+        self.add(self.kebab, 1)
+        self.assertEqual(CartItem.objects.get(food=self.pizza).quantity, 3)
+        self.assertEqual(self.totals(), (55, 4))
+
+        self.kebab.price = 30
+        self.kebab.save()
+        self.assertEqual(self.totals(), (60, 4))
+
+        item = CartItem.objects.get(food=self.pizza)
+        self.client.post(reverse('customer_remove_from_cart', kwargs={'item_id': item.id}))
+        self.assertEqual(self.totals(), (30, 1))
+
+    def test_one_cart_per_customer(self):
+        Cart.objects.create(customer=self.customer)
+        with self.assertRaises(IntegrityError):
+            Cart.objects.create(customer=self.customer)
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        self.customer, _ = make_customer('customer')
+        self.pizza = Food.objects.create(name='Pizza', description='-', price=10, stock=10, created_by=self.customer)
+        self.kebab = Food.objects.create(name='Kebab', description='-', price=25, stock=2, created_by=self.customer)
+        self.client.force_login(self.customer)
+
+    def post(self, lines):
+        return self.client.post(
+            reverse('customer_cart_batch'), json.dumps({'lines': lines}), content_type='application/json'
+        )
+
+    def test_adds_every_line_in_one_request(self):
+        response = self.post([
+            {'food_id': self.pizza.id, 'quantity': 1},
+            {'food_id': self.kebab.id, 'quantity': 2},
+            {'food_id': self.pizza.id, 'quantity': 2},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cart'], {'subtotal': 80, 'item_count': 5})
+        self.assertEqual(
+            dict(CartItem.objects.values_list('food__name', 'held')), {'Pizza': 3, 'Kebab': 2}
+        )
+
+    def test_rejects_unknown_foods_and_shortages_without_adding_anything(self):
+        response = self.post([{'food_id': self.pizza.id, 'quantity': 1}, {'food_id': 999, 'quantity': 1}])
+        self.assertEqual((response.status_code, response.json()['food_ids']), (400, [999]))
+        self.assertEqual(self.post([{'food_id': self.pizza.id, 'quantity': 0}]).status_code, 400)
+        for quantity in (10 ** 23, 9999999999, CartBatchView.max_quantity + 1):
+            self.assertEqual(self.post([{'food_id': self.pizza.id, 'quantity': quantity}]).status_code, 400)
+        half = {'food_id': self.pizza.id, 'quantity': CartBatchView.max_quantity // 2 + 1}
+        self.assertEqual(self.post([half, half]).status_code, 400)
+        lines = [{'food_id': food_id, 'quantity': CartBatchView.max_quantity} for food_id in range(1, 7)]
+        self.assertEqual(self.post(lines).status_code, 400)
+
+        response = self.post([{'food_id': self.pizza.id, 'quantity': 1}, {'food_id': self.kebab.id, 'quantity': 3}])
+        self.assertEqual((response.status_code, response.json()['food_ids']), (409, [self.kebab.id]))
+        self.assertFalse(CartItem.objects.exists())
+        self.pizza.refresh_from_db()
+        self.assertEqual(self.pizza.reserved, 0)
+
+
+class ConcurrentHoldTests(TransactionTestCase):
+    shoppers = 12
+    stock = 5
+
+    def test_parallel_adds_never_reserve_more_than_stock(self):
+        owner = User.objects.create_user('owner')
+        food = Food.objects.create(name='Pizza', description='-', price=10, stock=self.stock, created_by=owner)
+        clients = []
+        for index in range(self.shoppers):
+            customer, _ = make_customer(f'shopper{index}')
+            Cart.objects.create(customer=customer)
+            client = Client()
+            client.force_login(customer)
+            clients.append(client)
+
+        barrier = threading.Barrier(self.shoppers)
+
+        def add(client):
+            barrier.wait()
+            try:
+                client.post(reverse('customer_add_to_cart', kwargs={'food_id': food.id}), {'quantity': 1})
+            except OperationalError:
+                pass
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        food.refresh_from_db()
+        held = sum(CartItem.objects.filter(food=food).values_list('held', flat=True))
+        self.assertLessEqual(food.reserved, self.stock)
+        self.assertEqual(food.reserved, held)
+        self.assertEqual(CartItem.objects.filter(food=food).count(), held)
+
+
+class MenuSearchTests(TestCase):
+    def setUp(self):
+        self.customer, _ = make_customer('customer')
+        self.kebab = Food.objects.create(
+            name='كباب كوبيده', description='با برنج ايراني', price=12, category='kebab', created_by=self.customer,
+        )
+        self.rice = Food.objects.create(
+            name='چلو', description='برنج با کباب', price=5, category='kebab', created_by=self.customer,
+        )
+        self.pizza = Food.objects.create(
+            name='Pizza ۲۴', description='Cheese', price=9, category='pizza', created_by=self.customer,
+        )
+
+    def test_arabic_spellings_digits_and_prefixes_match(self):
+        self.assertEqual(search_ids('کباب'), [self.kebab.id, self.rice.id])
+        self.assertEqual(search_ids('ایرانی'), [self.kebab.id])
+        self.assertEqual(search_ids('کوب'), [self.kebab.id])
+        self.assertEqual(search_ids('pizza 24'), [self.pizza.id])
+        self.assertEqual(search_ids('کباب', category='pizza'), [])
+        self.assertEqual(search_ids('" OR'), [])
+        # Too many matches to rank: name matches come first without BM25.
+        with mock.patch('main.search.RANKED_CANDIDATES', 1):
+            self.assertEqual(search_ids('کباب'), [self.kebab.id, self.rice.id])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.pizza.name = 'Margherita'
+        self.pizza.save()
+        self.assertEqual(search_ids('pizza'), [])
+        self.assertEqual(search_ids('marg'), [self.pizza.id])
+        self.pizza.delete()
+        self.assertEqual(search_ids('marg'), [])
+
+        Food.objects.filter(pk=self.rice.pk).update(name='Saffron rice')
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE main_food_search')
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search_ids('saffron'), [self.rice.id])
+
+    def test_search_views(self):
+        self.client.force_login(self.customer)
+        response = self.client.get(reverse('customer_food_search'), {'q': 'كباب'})
+        self.assertEqual([food['id'] for food in response.json()['results']], [self.kebab.id, self.rice.id])
+
+        response = self.client.get(reverse('customer_food_list'), {'q': 'کباب', 'sort_by': 'price_asc'})
+        self.assertEqual(list(response.context['foods']), [self.rice, self.kebab])
+
+
+class SimilarFoodTests(TestCase):
+    def setUp(self):
+        owner, _ = make_customer('owner')
+        menu = [
+            ('Koobideh kebab', 'grilled minced lamb kebab'),
+            ('Joojeh kebab', 'grilled chicken kebab with saffron'),
+            ('Margherita pizza', 'tomato and cheese pizza'),
+            ('Pepperoni pizza', 'spicy cheese pizza'),
+        ]
+        self.koobideh, self.joojeh, self.margherita, self.pepperoni = [
+            Food.objects.create(name=name, description=description, price=10, created_by=owner)
+            for name, description in menu
+        ]
+
+    def neighbours(self, food):
+        return list(get_similar(food))
+
+    def test_neighbours_follow_the_text_and_match_a_full_rebuild(self):
+        call_command('rebuild_similar_foods', stdout=StringIO())
+        self.assertEqual(self.neighbours(self.pepperoni), [self.margherita])
+        self.assertEqual(self.neighbours(self.koobideh), [self.joojeh])
+
+        self.joojeh.name, self.joojeh.description = 'Chicken pizza', 'chicken and cheese pizza'
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.joojeh.save()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.neighbours(self.koobideh), [])
+        self.assertEqual(set(self.neighbours(self.joojeh)), {self.pepperoni, self.margherita})
+        incremental = set(SimilarFood.objects.values_list('food', 'similar'))
+
+        call_command('rebuild_similar_foods', stdout=StringIO())
+        self.assertEqual(set(SimilarFood.objects.values_list('food', 'similar')), incremental)
+
+    def test_saves_that_keep_the_text_skip_the_update(self):
+        food = Food.objects.get(pk=self.koobideh.pk)
+        food.stock = 5
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks() as callbacks:
+            food.save()
+        self.assertEqual(callbacks, [])
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT')])
+
+    def test_top_neighbours_excludes_the_row_itself(self):
+        matrix = tfidf_matrix([['a', 'b'], ['a', 'b'], ['c']])
+        columns, scores = top_neighbours(matrix, [0, 2], k=1)
+        self.assertEqual(columns.tolist(), [[1], [0]])
+        self.assertAlmostEqual(scores[0][0], 1.0, places=5)
+        self.assertEqual(scores[1][0], 0)
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.customer, self.address = make_customer('customer')
+        self.pizzas = [
+            Food.objects.create(
+                name=f'Pizza {index}', description='-', price=10, stock=5, category='pizza',
+                rating=index, created_by=self.customer,
+            )
+            for index in range(1, 4)
+        ]
+        self.salad = Food.objects.create(
+            name='Salad', description='-', price=10, stock=5, category='salad', created_by=self.customer,
+        )
+
+    def place_order(self, *lines):
+        order = Order.objects.create(customer=self.customer, address='-')
+        OrderItem.objects.bulk_create([OrderItem(order=order, food=food, quantity=quantity) for food, quantity in lines])
+        return order
+
+    def stored(self):
+        return dict(Recommendation.objects.filter(customer=self.customer).values_list('food_id', 'score'))
+
+    def test_checkout_updates_the_list_incrementally(self):
+        cart = Cart.objects.create(customer=self.customer)
+        CartItem.objects.create(cart=cart, food=self.pizzas[0], quantity=2)
+        self.client.force_login(self.customer)
+        self.client.post(reverse('customer_checkout'), {'address_id': self.address.id})
+
+        self.assertEqual(self.stored(), {self.pizzas[1].id: 2, self.pizzas[2].id: 2})
+        self.assertEqual(list(get_recommendations(self.customer)), [self.pizzas[2], self.pizzas[1]])
+        incremental = self.stored()
+        rebuild_recommendations(self.customer)
+        self.assertEqual(self.stored(), incremental)
+
+    def test_a_new_order_adds_weight_and_drops_what_was_ordered(self):
+        record_order(self.place_order((self.pizzas[0], 1)))
+        record_order(self.place_order((self.pizzas[1], 3), (self.salad, 1)))
+        # Pizza 2 was just ordered; pizza 3 keeps its row with both orders' weight.
+        self.assertEqual(self.stored(), {self.pizzas[2].id: 4})
+
+    def test_the_list_is_trimmed_to_its_limit_by_score(self):
+        burgers = Food.objects.bulk_create([
+            Food(name=f'Burger {index}', description='-', price=10, category='burger', created_by=self.customer)
+            for index in range(RECOMMENDATION_LIMIT + 5)
+        ])
+        record_order(self.place_order((self.pizzas[0], 1)))
+        self.assertEqual(len(self.stored()), 2)
+
+        record_order(self.place_order((burgers[0], 5)))
+        stored = self.stored()
+        self.assertEqual(len(stored), RECOMMENDATION_LIMIT)
+        # The burgers outweigh the pizzas, which are trimmed first.
+        self.assertEqual(set(stored.values()), {5})
+        self.assertNotIn(burgers[0].id, stored)
+
+
+class PopularityTests(TestCase):
+    def setUp(self):
+        self.customer, _ = make_customer('customer')
+        self.pizza, self.kebab, self.salad = [
+            Food.objects.create(name=name, description='-', price=10, created_by=self.customer)
+            for name in ('Pizza', 'Kebab', 'Salad')
+        ]
+        self.today = timezone.now()
+
+    def complete(self, days_ago, *lines):
+        moment = self.today - timedelta(days=days_ago)
+        order = Order.objects.create(customer=self.customer, address='-', status='completed')
+        Order.objects.filter(pk=order.pk).update(order_date=moment)
+        OrderItem.objects.bulk_create([OrderItem(order=order, food=food, quantity=quantity) for food, quantity in lines])
+        record_completed_order(order, moment)
+        return order
+
+    def test_sale_weight_doubles_every_half_life(self):
+        self.assertAlmostEqual(sale_weight(3, self.today) / sale_weight(1, self.today), 3)
+        self.assertAlmostEqual(sale_weight(1, self.today + POPULARITY_HALF_LIFE) / sale_weight(1, self.today), 2)
+
+    def test_recent_sales_outrank_older_larger_ones(self):
+        self.complete(60, (self.pizza, 3))
+        self.complete(0, (self.kebab, 1))
+        self.assertEqual(list(popular_foods()), [self.kebab, self.pizza])
+        self.pizza.refresh_from_db()
+        # Two half-lives leave a quarter of the three pizzas.
+        self.assertAlmostEqual(decayed_score(self.pizza, self.today), 0.75, places=6)
+
+    def test_record_completed_order_credits_every_line(self):
+        self.complete(0, (self.pizza, 2), (self.kebab, 1))
+        scores = dict(Food.objects.values_list('pk', 'popularity'))
+        self.assertAlmostEqual(scores[self.pizza.pk], sale_weight(2, self.today))
+        self.assertAlmostEqual(scores[self.kebab.pk], sale_weight(1, self.today))
+        self.assertEqual(scores[self.salad.pk], 0)
+
+    def test_saving_a_stale_food_keeps_its_popularity(self):
+        stale = Food.objects.get(pk=self.pizza.pk)
+        self.complete(0, (self.pizza, 2))
+        stale.price = 11
+        stale.save()
+        self.pizza.refresh_from_db()
+        self.assertAlmostEqual(self.pizza.popularity, sale_weight(2, self.today))
+
+    def test_rebuild_matches_the_incremental_scores(self):
+        self.complete(90, (self.pizza, 4), (self.salad, 1))
+        self.complete(10, (self.kebab, 2))
+        self.complete(0, (self.pizza, 1))
+        pending = Order.objects.create(customer=self.customer, address='-')
+        OrderItem.objects.create(order=pending, food=self.salad, quantity=9)
+        incremental = dict(Food.objects.values_list('pk', 'popularity'))
+
+        self.assertEqual(rebuild_popularity(), 3)
+        for pk, score in Food.objects.values_list('pk', 'popularity'):
+            self.assertAlmostEqual(score, incremental[pk], delta=incremental[pk] * 1e-9)
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        media_settings = override_settings(MEDIA_ROOT=self.media_root, MEDIA_URL='/media/')
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.owner, _ = make_customer('owner')
+
+    def food_with_image(self, name, size):
+        path = f'{self.media_root}/food_images/{name}'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        Image.new('RGB', size, 'orange').save(path)
+        return Food.objects.create(
+            name='Pizza', description='-', price=10, image=f'food_images/{name}', created_by=self.owner,
+        )
+
+    def test_saving_a_food_writes_every_variant(self):
+        food = self.food_with_image('pizza.jpg', (1000, 500))
+        self.assertEqual(food.image_variants, {'source': 'food_images/pizza.jpg', 'widths': list(VARIANT_WIDTHS)})
+        for width in VARIANT_WIDTHS:
+            for extension in ('webp', 'jpg'):
+                with Image.open(f'{self.media_root}/{variant_name(food.image.name, width, extension)}') as variant:
+                    self.assertEqual(variant.size, (width, width // 2))
+        food.refresh_from_db()
+        self.assertEqual(
+            srcset(food, 'webp'),
+            '/media/food_images/pizza.w200.webp 200w, /media/food_images/pizza.w400.webp 400w, '
+            '/media/food_images/pizza.w800.webp 800w',
+        )
+
+    def test_small_images_are_not_upscaled(self):
+        food = self.food_with_image('salad.png', (300, 300))
+        self.assertEqual(food.image_variants['widths'], [200])
+        self.assertFalse(os.path.exists(f'{self.media_root}/food_images/salad.w400.jpg'))
+
+    def test_missing_variants_fall_back_to_the_original(self):
+        food = Food.objects.create(
+            name='Kebab', description='-', price=10, image='food_images/missing.jpg', created_by=self.owner,
+        )
+        self.assertEqual(food.image_variants['widths'], [])
+        self.assertEqual(srcset(food, 'jpg'), '')
+
+        food = self.food_with_image('pizza.jpg', (1000, 500))
+        # Replaced image whose derivatives were not generated yet.
+        food.image = 'food_images/other.jpg'
+        self.assertEqual(srcset(food, 'jpg'), '')
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('customer_food_list'))
+        self.assertContains(response, 'srcset="/media/food_images/pizza.w200.jpg 200w')
+        self.assertContains(response, 'src="/media/food_images/missing.jpg" srcset=""')
+
+
+class CollaborativeRecommendationTests(TestCase):
+    def setUp(self):
+        owner, _ = make_customer('owner')
+        self.pizza, self.burger, self.salad = [
+            Food.objects.create(name=name, description='-', price=10, created_by=owner)
+            for name in ('Pizza', 'Burger', 'Salad')
+        ]
+        self.fan, _ = make_customer('fan')
+        self.newcomer, _ = make_customer('newcomer')
+        self.dieter, _ = make_customer('dieter')
+        FoodRating.objects.create(food=self.pizza, user=self.fan, rating=5)
+        order = Order.objects.create(customer=self.fan, address='-')
+        OrderItem.objects.create(order=order, food=self.burger, quantity=2)
+        FoodRating.objects.create(food=self.salad, user=self.dieter, rating=4)
+        FoodRating.objects.create(food=self.pizza, user=self.newcomer, rating=4)
+
+    def test_customers_get_what_similar_customers_liked(self):
+        report = StringIO()
+        call_command('rebuild_collaborative_recommendations', stdout=report)
+        stats = json.loads(report.getvalue())
+        self.assertEqual((stats['customers'], stats['foods'], stats['interactions']), (3, 3, 4))
+
+        self.assertEqual(list(get_recommendations(self.newcomer)), [self.burger])
+        self.assertEqual(list(get_recommendations(self.fan)), [])
+        # Salad never co-occurs with anything, so the dieter has no picks.
+        self.assertEqual(list(get_recommendations(self.dieter)), [])
+
+    def test_interactions_in_one_pair_add_up(self):
+        FoodRating.objects.create(food=self.burger, user=self.newcomer, rating=1)
+        matrix = InteractionMatrix(*stream_interactions())
+        fan = list(matrix.customers).index(self.fan.id)
+        block = matrix.dense_rows(fan, fan + 1)
+        self.assertAlmostEqual(float(block.sum()), 5 * RATING_WEIGHT + float(np.log1p(2)) * ORDER_WEIGHT, places=5)
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        self.customer, _ = make_customer('customer')
+        self.rival, _ = make_customer('rival')
+        self.pizza = Food.objects.create(name='Pizza', description='-', price=10, created_by=self.customer)
+        self.kebab = Food.objects.create(name='Kebab', description='-', price=12, created_by=self.customer)
+
+    def aggregates(self, food):
+        food.refresh_from_db()
+        return food.rating_sum, food.rating_count, float(food.rating)
+
+    def test_create_edit_move_and_delete(self):
+        rating = FoodRating.objects.create(food=self.pizza, user=self.customer, rating=4)
+        FoodRating.objects.create(food=self.pizza, user=self.rival, rating=5)
+        self.assertEqual(self.aggregates(self.pizza), (9, 2, 4.5))
+
+        rating.rating = 2
+        rating.save()
+        self.assertEqual(self.aggregates(self.pizza), (7, 2, 3.5))
+
+        rating.food = self.kebab
+        rating.save()
+        self.assertEqual(self.aggregates(self.pizza), (5, 1, 5.0))
+        self.assertEqual(self.aggregates(self.kebab), (2, 1, 2.0))
+
+        rating.delete()
+        self.assertEqual(self.aggregates(self.kebab), (0, 0, 0.0))
+
+    def test_saving_a_stale_food_keeps_the_rating(self):
+        stale = Food.objects.get(pk=self.pizza.pk)
+        FoodRating.objects.create(food=self.pizza, user=self.customer, rating=4)
+        stale.price = 11
+        stale.save()
+        self.assertEqual(self.aggregates(self.pizza), (4, 1, 4.0))
+        self.assertEqual(self.pizza.price, 11)
+
+    def test_failed_save_leaves_aggregates_alone(self):
+        rating = FoodRating.objects.create(food=self.pizza, user=self.customer, rating=4)
+        rating.rating = None
+        with self.assertRaises(IntegrityError):
+            rating.save()
+        self.assertEqual(self.aggregates(self.pizza), (4, 1, 4.0))
+
+    def test_detail_page_validates_the_rating(self):
+        self.client.force_login(self.customer)
+        url = reverse('customer_food_detail', kwargs={'food_id': self.pizza.pk})
+        response = self.client.post(url, {'rating': 4, 'comment': 'Good'})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertEqual(self.client.post(url, {'comment': 'No rating'}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'rating': 9}).status_code, 400)
+        self.assertEqual(self.aggregates(self.pizza), (4, 1, 4.0))
+        self.assertEqual(FoodRating.objects.get().comment, 'Good')
+
+    def test_rebuild_ratings_fixes_drift(self):
+        FoodRating.objects.create(food=self.pizza, user=self.customer, rating=3)
+        stale = timezone.now() - timedelta(days=1)
+        Food.objects.filter(pk=self.pizza.pk).update(rating_sum=10, rating_count=7, rating=1.43, updated_at=stale)
+        out = StringIO()
+        call_command('rebuild_ratings', stdout=out)
+        self.assertIn('Fixed 1 food(s)', out.getvalue())
+        self.assertEqual(self.aggregates(self.pizza), (3, 1, 3.0))
+        self.assertGreater(self.pizza.updated_at, stale)
+
+
+class OrderListRevenueTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_superuser('manager', password='secret')
+        self.food = Food.objects.create(name='Pizza', description='-', price=10, created_by=self.manager)
+        for index in range(25):
+            order = Order.objects.create(customer=self.manager, address='-', status='completed')
+            OrderItem.objects.create(order=order, food=self.food, quantity=2)
+        self.client.force_login(self.manager)
+
+    def test_revenue_covers_all_filtered_orders(self):
+        response = self.client.get(reverse('order_list'), {'status': 'completed'})
+        self.assertEqual(response.context['total_revenue'], 500)
+        response = self.client.get(reverse('order_list'), {'status': 'pending'})
+        self.assertEqual(response.context['total_revenue'], 0)
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.customer, _ = make_customer('customer')
+        self.foods = [
+            Food.objects.create(
+                name=f'Food {index}', description='-', price=10, category=category, created_by=self.customer,
+            )
+            for index, category in enumerate(['pizza', 'pizza', 'pizza', 'kebab'])
+        ]
+        self.client.force_login(self.customer)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_food_list')).status_code, 403)
+
+    def test_sparse_fields_and_cursor_pagination(self):
+        url = reverse('api_food_list')
+        response = self.client.get(url, {'category': 'pizza', 'fields': 'id,name', 'page_size': 2})
+        page = response.json()
+        self.assertEqual(page['results'], [
+            {'id': food.id, 'name': food.name} for food in reversed(self.foods[1:3])
+        ])
+        response = self.client.get(page['next'])
+        self.assertEqual([food['id'] for food in response.json()['results']], [self.foods[0].id])
+        self.assertIsNone(response.json()['next'])
+        self.assertEqual(self.client.get(url, {'fields': 'id,secret'}).status_code, 400)
+
+    def test_unchanged_menu_is_not_modified(self):
+        url = reverse('api_food_list')
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([query for query in queries if 'main_food' in query['sql']])
+
+        self.assertNotEqual(self.client.get(url, {'fields': 'id'})['ETag'], etag)
+        FoodRating.objects.create(food=self.foods[0], user=self.customer, rating=4)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cart_and_orders(self):
+        cart_url = reverse('api_cart')
+        self.assertEqual(self.client.get(cart_url).json()['items'], [])
+        cart = Cart.objects.create(customer=self.customer, subtotal=20, item_count=2)
+        CartItem.objects.create(cart=cart, food=self.foods[0], quantity=2)
+        response = self.client.get(cart_url)
+        self.assertEqual(response.json()['items'][0]['food']['id'], self.foods[0].id)
+        self.assertEqual(self.client.get(cart_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        order = Order.objects.create(customer=self.customer, address='-')
+        OrderItem.objects.create(order=order, food=self.foods[1], quantity=3)
+        response = self.client.get(reverse('api_order_list'))
+        self.assertEqual(response.json()['results'][0]['items'][0]['quantity'], 3)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(reverse('api_order_list'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        order.status = 'cancelled'
+        order.save()
+        self.assertEqual(self.client.get(reverse('api_order_list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        other, _ = make_customer('other')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('api_order_detail', kwargs={'order_id': order.pk})).status_code, 404)
+
+
+    def test_editing_an_order_changes_its_etags(self):
+        order = Order.objects.create(customer=self.customer, address='-', total_price=30)
+        urls = [reverse('api_order_list'), reverse('api_order_detail', kwargs={'order_id': order.pk})]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        order.total_price = 25
+        order.save()
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_price'], '25.00')
+
+    def test_editing_a_food_changes_the_etags_of_orders_showing_it(self):
+        order = Order.objects.create(customer=self.customer, address='-')
+        OrderItem.objects.create(order=order, food=self.foods[0], quantity=2)
+        urls = [reverse('api_order_list'), reverse('api_order_detail', kwargs={'order_id': order.pk})]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        self.foods[0].name = 'Renamed'
+        self.foods[0].save()
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['items'][0]['food']['name'], 'Renamed')
+
+
+class ConditionalMenuTests(TestCase):
+    def setUp(self):
+        self.customer, _ = make_customer('customer')
+        self.pizza = Food.objects.create(
+            name='Pizza', description='-', price=10, stock=5, category='pizza', created_by=self.customer,
+        )
+        self.kebab = Food.objects.create(
+            name='Kebab', description='-', price=12, stock=5, category='kebab', created_by=self.customer,
+        )
+        self.client.force_login(self.customer)
+
+    def assertNotModified(self, url):
+        # The first request sets the CSRF cookie the page's tokens come from.
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        return etag
+
+    def test_triggers_bump_the_category_of_shown_changes(self):
+        pizza = MenuVersion.objects.get(category='pizza').version
+        Food.objects.filter(pk=self.pizza.pk).update(reserved=F('reserved') + 1)
+        Food.objects.filter(pk=self.kebab.pk).update(popularity=5)
+        self.assertEqual(MenuVersion.objects.get(category='pizza').version, pizza + 1)
+        kebab = MenuVersion.objects.get(category='kebab').version
+        self.kebab.category = 'pizza'
+        self.kebab.save()
+        self.assertEqual(MenuVersion.objects.get(category='kebab').version, kebab + 1)
+        self.assertEqual(MenuVersion.objects.get(category='pizza').version, pizza + 2)
+        self.pizza.delete()
+        self.assertEqual(MenuVersion.objects.get(category='pizza').version, pizza + 3)
+
+    def test_customer_pages_follow_menu_recommendations_and_ratings(self):
+        url = reverse('customer_food_list')
+        etag = self.assertNotModified(url)
+        Recommendation.objects.create(customer=self.customer, food=self.pizza, score=1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.assertNotModified(url)
+        Food.objects.filter(pk=self.kebab.pk).update(reserved=5)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        other, _ = make_customer('other')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        url = reverse('customer_food_detail', kwargs={'food_id': self.pizza.pk})
+        etag = self.assertNotModified(url)
+        rating = FoodRating.objects.create(food=self.kebab, user=other, rating=4)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.assertNotModified(url)
+        FoodRating.objects.filter(pk=rating.pk).update(food=self.pizza)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_manager_food_list_answers_if_modified_since(self):
+        manager = User.objects.create_superuser('manager', password='secret')
+        self.client.force_login(manager)
+        url = reverse('food_list')
+        response = self.client.get(url, {'category': 'kebab'})
+        since = response['Last-Modified']
+        self.assertEqual(self.client.get(url, {'category': 'kebab'}, HTTP_IF_MODIFIED_SINCE=since).status_code, 304)
+        self.assertNotModified(url)
+
+
+class QueryBudgetMixin:
+    """Assert that a request stays within its URL name's query budget."""
+
+    def assertQueryBudget(self, client, url_name, method='get', kwargs=None, data=None):
+        # A string is an already encoded JSON body.
+        options = {'content_type': 'application/json'} if isinstance(data, str) else {}
+        with CaptureQueriesContext(connection) as queries:
+            getattr(client, method)(reverse(url_name, kwargs=kwargs), data, **options)
+        budget = query_budget_for(url_name)
+        self.assertLessEqual(
+            len(queries), budget,
+            f"{url_name} ran {len(queries)} queries, budget is {budget}:\n"
+            + "\n".join(query['sql'] for query in queries.captured_queries),
+        )
+        return len(queries)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_superuser('manager', password='secret')
+        cls.employee = User.objects.create_user('employee', password='secret', role=User.EMPLOYEE)
+        cls.employee.groups.add(Group.objects.create(name='Employee'))
+        cls.staff = Employee.objects.create(user=cls.employee, phone_number='0912', role='staff')
+        cls.customer, cls.address = make_customer('customer')
+
+        cls.foods = [
+            Food.objects.create(
+                name=f'Food {index}', description='-', price=10 + index, stock=100,
+                category=category, created_by=cls.manager,
+            )
+            for index, (category, _) in enumerate(Food.CATEGORY_CHOICES * 2)
+        ]
+        cls.food = cls.foods[0]
+        cls.cart = Cart.objects.create(customer=cls.customer)
+        cls.cart_items = [CartItem.objects.create(cart=cls.cart, food=food, quantity=2) for food in cls.foods[:5]]
+        for status in ('pending', 'pending', 'completed', 'completed'):
+            order = Order.objects.create(customer=cls.customer, address='-', status=status)
+            for food in cls.foods[:5]:
+                OrderItem.objects.create(order=order, food=food, quantity=1)
+        cls.order = order
+        cls.rating = FoodRating.objects.create(food=cls.food, user=cls.customer, rating=4, comment='Good')
+        FoodRating.objects.create(food=cls.food, user=cls.manager, rating=5, comment='Great')
+        cls.discount = Discount.objects.create(code='OFF10', percent=10)
+
+    def routes(self):
+        """(url name, method, user, url kwargs, data) for every route in main/urls.py."""
+        return [
+            ('home', 'get', self.customer, None, None),
+            ('signup', 'get', None, None, None),
+            ('login', 'get', None, None, None),
+            ('logout', 'post', self.customer, None, None),
+            ('profile', 'get', self.customer, None, None),
+            ('manager_dashboard', 'get', self.manager, None, None),
+            ('discount_list', 'get', self.manager, None, None),
+            ('discount_delete', 'post', self.manager, {'pk': self.discount.pk}, None),
+            ('top_selling_foods', 'get', self.manager, None, None),
+            ('food_list', 'get', self.manager, None, None),
+            ('food_detail', 'get', self.manager, {'food_id': self.food.pk}, None),
+            ('add_food', 'get', self.manager, None, None),
+            ('edit_food', 'get', self.manager, {'pk': self.food.pk}, None),
+            ('delete_food', 'get', self.manager, {'pk': self.food.pk}, None),
+            ('edit_rating', 'get', self.manager, {'pk': self.rating.pk}, None),
+            ('delete_rating', 'post', self.manager, {'pk': self.rating.pk}, None),
+            ('food_comments', 'get', self.manager, {'food_id': self.food.pk}, None),
+            ('reply_to_comment', 'post', self.manager, {'rating_id': self.rating.pk}, {'reply': 'Thanks'}),
+            ('add_employee', 'get', self.manager, None, None),
+            ('employee_list', 'get', self.manager, None, None),
+            ('edit_employee', 'get', self.manager, {'pk': self.staff.pk}, None),
+            ('delete_employee', 'get', self.manager, {'pk': self.staff.pk}, None),
+            ('employee_dashboard', 'get', self.employee, None, None),
+            ('order_list', 'get', self.manager, None, None),
+            ('order_detail', 'get', self.manager, {'pk': self.order.pk}, None),
+            ('order_pending_list', 'get', self.employee, None, None),
+            ('order_complete', 'post', self.employee, {'pk': self.order.pk}, None),
+            ('order_completed_list', 'get', self.employee, None, None),
+            ('order_report', 'get', self.manager, None, None),
+            ('order_report_export', 'get', self.manager, None, {'format': 'jsonl'}),
+            ('customer_dashboard', 'get', self.customer, None, None),
+            ('customer_food_list', 'get', self.customer, None, None),
+            ('customer_food_search', 'get', self.customer, None, {'q': 'foo'}),
+            ('customer_food_detail', 'get', self.customer, {'food_id': self.food.pk}, None),
+            ('rate_food', 'get', self.customer, {'food_id': self.food.pk}, None),
+            ('customer_cart_detail', 'get', self.customer, None, None),
+            ('customer_add_to_cart', 'post', self.customer, {'food_id': self.food.pk}, {'quantity': 1}),
+            ('customer_cart_batch', 'post', self.customer, None, json.dumps({
+                'lines': [{'food_id': food.pk, 'quantity': 1} for food in self.foods[:8]],
+            })),
+            ('customer_remove_from_cart', 'post', self.customer, {'item_id': self.cart_items[0].pk}, None),
+            ('customer_order_list', 'get', self.customer, None, None),
+            ('customer_order_detail', 'get', self.customer, {'order_id': self.order.pk}, None),
+            ('customer_order_intake', 'get', self.customer, {'reference': 'unknown'}, None),
+            ('customer_checkout', 'get', self.customer, None, None),
+            ('manage_addresses', 'get', self.customer, None, None),
+            ('customer_add_address', 'get', self.customer, None, None),
+            ('cancel_order', 'post', self.customer, {'order_id': self.order.pk}, None),
+            ('api_food_list', 'get', self.customer, None, None),
+            ('api_food_detail', 'get', self.customer, {'food_id': self.food.pk}, None),
+            ('api_cart', 'get', self.customer, None, None),
+            ('api_order_list', 'get', self.customer, None, None),
+            ('api_order_detail', 'get', self.customer, {'order_id': self.order.pk}, None),
+        ]
+
+    def test_every_route_is_budgeted(self):
+        covered = {route[0] for route in self.routes()}
+        named = {pattern.name for pattern in urls.urlpatterns if pattern.name}
+        self.assertEqual(named - covered, set())
+
+    def test_routes_stay_within_query_budget(self):
+        for url_name, method, user, kwargs, data in self.routes():
+            with self.subTest(url_name=url_name):
+                client = Client()
+                if user:
+                    client.force_login(user)
+                with transaction.atomic():
+                    self.assertQueryBudget(client, url_name, method, kwargs, data)
+                    transaction.set_rollback(True)
+
+
+@override_settings(QUERY_BUDGET_ENABLED=True, DEBUG=True, QUERY_BUDGETS={'customer_food_list': 1})
+class QueryBudgetMiddlewareTests(TestCase):
+    def test_reports_queries_and_logs_over_budget(self):
+        customer, _ = make_customer('customer')
+        self.client.force_login(customer)
+        with self.assertLogs('main.query_budget', level='WARNING') as logs:
+            response = self.client.get(reverse('customer_food_list'))
+        self.assertGreater(int(response['X-Query-Count']), 1)
+        self.assertIn('X-Query-Time-Ms', response)
+        self.assertIn('customer_food_list', logs.output[0])
+
+
+class RoleResolutionTests(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(name='Employee')
+        self.employee = User.objects.create_user('employee', password='secret')
+        self.employee.groups.add(self.group)
+
+    def get(self, url_name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name))
+        group_queries = [query for query in queries.captured_queries if 'auth_group' in query['sql']]
+        return response, group_queries
+
+    def test_role_is_resolved_at_login_and_served_from_the_session(self):
+        self.client.force_login(self.employee)
+        response, group_queries = self.get('order_pending_list')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(group_queries, [])
+        response, group_queries = self.get('home')
+        self.assertRedirects(response, reverse('employee_dashboard'), fetch_redirect_response=False)
+        self.assertEqual(group_queries, [])
+
+    def test_group_changes_invalidate_the_cached_role(self):
+        self.client.force_login(self.employee)
+        self.employee.groups.remove(self.group)
+        response, group_queries = self.get('order_pending_list')
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.assertEqual(len(group_queries), 1)
+
+        self.group.user_set.add(self.employee)
+        self.assertEqual(self.get('order_pending_list')[0].status_code, 200)
+        self.group.user_set.clear()
+        self.assertEqual(self.get('order_pending_list')[0].status_code, 302)
+
+    def test_promotion_to_superuser_invalidates_the_cached_role(self):
+        self.client.force_login(self.employee)
+        self.assertRedirects(self.get('home')[0], reverse('employee_dashboard'), fetch_redirect_response=False)
+        User.objects.filter(pk=self.employee.pk).update(is_superuser=True, is_staff=True)
+        self.assertRedirects(self.get('home')[0], reverse('manager_dashboard'), fetch_redirect_response=False)
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f'{directory.name}/cache.sqlite3'
+
+    def backend(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_the_suite_leaves_the_site_cache_alone(self):
+        self.assertNotIsInstance(caches['default'], SQLiteCache)
+
+    def test_entries_are_shared_between_processes(self):
+        # Two backends on one file stand in for two gunicorn workers.
+        first, second = self.backend(), self.backend()
+        first.set('greeting', {'text': 'salam'})
+        self.assertEqual(second.get('greeting'), {'text': 'salam'})
+        self.assertFalse(second.add('greeting', 'other'))
+        second.set('short', 1, timeout=-1)
+        self.assertIsNone(first.get('short'))
+        self.assertTrue(first.add('short', 2))
+        self.assertTrue(second.delete('greeting'))
+        self.assertFalse(first.has_key('greeting'))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = self.backend(MAX_ENTRIES=4, CULL_EVERY=1, CULL_FREQUENCY=2, ACCESS_RESOLUTION=0)
+        clock = count(1000)
+        with mock.patch('main.cache.time.time', lambda: next(clock)):
+            for key in 'abcd':
+                cache.set(key, key)
+            cache.get('a')
+            cache.set('e', 'e')
+            self.assertEqual([key for key in 'abcde' if cache.has_key(key)], ['a', 'e'])
+
+
+class SessionStorageTests(TestCase):
+    def profile_queries(self):
+        user, _ = make_customer('customer')
+        client = Client()
+        client.force_login(user)
+        client.get(reverse('profile'))
+        with CaptureQueriesContext(connection) as queries:
+            client.get(reverse('profile'))
+        return len(queries)
+
+    def test_cached_sessions_skip_the_session_table(self):
+        cached = self.profile_queries()
+        User.objects.all().delete()
+        with self.settings(SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            database = self.profile_queries()
+        self.assertEqual(cached, database - 1)
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_superuser('manager', password='secret')
+        self.employee = User.objects.create_user('employee', password='secret')
+        self.employee.groups.add(Group.objects.create(name='Employee'))
+        self.pizza = Food.objects.create(name='Pizza', description='-', price=10, created_by=self.manager)
+        self.kebab = Food.objects.create(name='Kebab', description='-', price=20, created_by=self.manager)
+
+    def place_order(self, **quantities):
+        order = Order.objects.create(customer=self.manager, address='-')
+        for name, quantity in quantities.items():
+            OrderItem.objects.create(order=order, food=getattr(self, name), quantity=quantity)
+        return order
+
+    def test_completing_orders_feeds_top_selling(self):
+        self.client.force_login(self.employee)
+        for order in (self.place_order(pizza=1, kebab=2), self.place_order(kebab=1)):
+            self.client.post(reverse('order_complete', kwargs={'pk': order.pk}))
+        self.place_order(pizza=9)  # still pending, not a sale yet
+
+        self.client.force_login(self.manager)
+        rows = list(self.client.get(reverse('top_selling_foods')).context['top_selling_foods'])
+        self.assertEqual(
+            [(row['food__name'], row['total_sales'], row['order_count'], row['revenue']) for row in rows],
+            [('Kebab', 3, 2, 60), ('Pizza', 1, 1, 10)],
+        )
+
+    def test_impossible_dates_are_ignored(self):
+        self.client.force_login(self.manager)
+        response = self.client.get(reverse('top_selling_foods'), {'start_date': '2024-02-30', 'end_date': '2024-13-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['start_date'])
+
+    def test_rebuild_matches_incremental_rollup(self):
+        self.client.force_login(self.employee)
+        for order in (self.place_order(pizza=1, kebab=2), self.place_order(kebab=1)):
+            self.client.post(reverse('order_complete', kwargs={'pk': order.pk}))
+        incremental = sorted(DailyFoodSales.objects.values_list('food_id', 'date', 'units', 'revenue', 'orders'))
+
+        call_command('rebuild_sales_rollup', stdout=StringIO())
+        rebuilt = sorted(DailyFoodSales.objects.values_list('food_id', 'date', 'units', 'revenue', 'orders'))
+        self.assertEqual(incremental, rebuilt)
+
+    def test_retraction_takes_back_the_revenue_credited(self):
+        order = self.place_order(pizza=2)
+        order.status = 'completed'
+        record_status_change(order, 'pending')
+        self.pizza.price = 15
+        self.pizza.save()
+        call_command('rebuild_sales_rollup', stdout=StringIO())
+        self.assertEqual(DailyFoodSales.objects.get().revenue, 20)
+
+        order.status = 'cancelled'
+        record_status_change(order, 'completed')
+        self.assertEqual(DailyFoodSales.objects.values_list('units', 'revenue', 'orders').get(), (0, 0, 0))
+
+
+    def test_cancelling_an_order_completed_meanwhile_keeps_it_completed(self):
+        order = self.place_order(pizza=2)
+
+        def completed_meanwhile(stale):
+            self.client.force_login(self.employee)
+            self.client.post(reverse('order_complete', kwargs={'pk': order.pk}))
+            return True
+
+        self.client.force_login(self.manager)
+        with mock.patch.object(Order, 'is_cancellable', completed_meanwhile):
+            self.client.post(reverse('cancel_order', kwargs={'order_id': order.pk}))
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'completed')
+        self.assertEqual(DailyFoodSales.objects.values_list('units', 'orders').get(), (2, 1))
+
+
+class OrderReportExportTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_superuser('manager', password='secret')
+        pizza = Food.objects.create(name='Pizza', description='-', price=10, created_by=self.manager)
+        kebab = Food.objects.create(name='Kebab', description='-', price=20, created_by=self.manager)
+        for status in ('completed', 'completed', 'cancelled'):
+            order = Order.objects.create(customer=self.manager, address='-', status=status, total_price=50)
+            OrderItem.objects.create(order=order, food=pizza, quantity=1)
+            OrderItem.objects.create(order=order, food=kebab, quantity=2)
+        self.client.force_login(self.manager)
+
+    def export(self, **params):
+        response = self.client.get(reverse('order_report_export'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_has_one_row_per_item(self):
+        lines = self.export(format='csv', status='completed').splitlines()
+        self.assertTrue(lines[0].startswith('order_id,order_date,status'))
+        self.assertEqual(len(lines), 1 + 4)
+        self.assertTrue(lines[2].endswith(',Kebab,irani,20,2,40'))
+
+    def test_jsonl_nests_items_per_order(self):
+        records = [json.loads(line) for line in self.export(format='jsonl').splitlines()]
+        self.assertEqual(len(records), 3)
+        self.assertEqual([item['quantity'] for item in records[0]['items']], [1, 2])
+        self.assertEqual(records[0]['order_total'], '50.00')
+
+    def test_jsonl_keeps_orders_without_items(self):
+        empty = Order.objects.create(customer=self.manager, address='-', status='cancelled', total_price=0)
+        records = [json.loads(line) for line in self.export(format='jsonl').splitlines()]
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[-1]['order_id'], empty.id)
+        self.assertEqual(records[-1]['items'], [])
+
+    def test_csv_keeps_orders_without_items(self):
+        empty = Order.objects.create(customer=self.manager, address='-', status='cancelled', total_price=0)
+        lines = self.export(format='csv').splitlines()
+        self.assertEqual(len(lines), 1 + 6 + 1)
+        self.assertTrue(lines[-1].startswith(f'{empty.id},'))
+        self.assertTrue(lines[-1].endswith(',cancelled,manager,0.00,0.00,,,,,,,'))
+
+    def test_impossible_dates_are_ignored(self):
+        for params in ({'start_date': '2024-02-30'}, {'end_date': '2024-13-01'}):
+            self.assertEqual(filtered_orders(params).count(), 3)
+            self.assertEqual(self.client.get(reverse('order_report'), params).status_code, 200)
+            self.assertEqual(len(self.export(format='jsonl', **params).splitlines()), 3)
+
+    def test_end_date_includes_its_whole_day(self):
+        day = timezone.now().date() - timedelta(days=3)
+        late, early = Order.objects.all()[:2]
+        midnight = timezone.make_aware(datetime.combine(day, time.min))
+        Order.objects.filter(pk=late.pk).update(order_date=midnight + timedelta(hours=23, minutes=59))
+        Order.objects.filter(pk=early.pk).update(order_date=midnight + timedelta(days=1))
+        params = {'start_date': day.isoformat(), 'end_date': day.isoformat()}
+        self.assertEqual(list(filtered_orders(params)), [late])
+        params['end_date'] = (day + timedelta(days=1)).isoformat()
+        self.assertEqual(set(filtered_orders(params)), {late, early})
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get(reverse('order_report_export'), {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.customer, _ = make_customer('customer')
+        self.orders = [Order.objects.create(customer=self.customer, address='-') for _ in range(45)]
+        # Several orders share a timestamp, so ties must be broken by id.
+        Order.objects.filter(id__in=[order.id for order in self.orders[10:30]]).update(
+            order_date=self.orders[10].order_date
+        )
+        self.client.force_login(self.customer)
+
+    def page(self, cursor=None):
+        params = {'cursor': cursor} if cursor else {}
+        context = self.client.get(reverse('customer_order_list'), params).context
+        return [order.id for order in context['orders']], context['keyset_page']
+
+    def test_walks_every_order_once_in_both_directions(self):
+        expected = list(Order.objects.order_by('-order_date', '-id').values_list('id', flat=True))
+        pages, cursor = [], None
+        while True:
+            ids, page = self.page(cursor)
+            pages.append((ids, page))
+            if not page['has_next']:
+                break
+            cursor = page['next_cursor']
+        self.assertEqual([order_id for ids, _ in pages for order_id in ids], expected)
+        self.assertEqual([len(ids) for ids, _ in pages], [20, 20, 5])
+        self.assertFalse(pages[0][1]['has_previous'])
+
+        ids, page = self.page(pages[2][1]['previous_cursor'])
+        self.assertEqual(ids, pages[1][0])
+        ids, page = self.page(page['previous_cursor'])
+        self.assertEqual(ids, pages[0][0])
+        self.assertFalse(page['has_previous'])
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        first, _ = self.page()
+        self.assertEqual(self.page('not-a-cursor')[0], first)
+
+    def test_pending_board_pages_oldest_first(self):
+        employee = User.objects.create_user('employee', password='secret', role=User.EMPLOYEE)
+        employee.groups.add(Group.objects.create(name='Employee'))
+        self.client.force_login(employee)
+        expected = list(Order.objects.order_by('order_date', 'id').values_list('id', flat=True))
+        pages, cursor = [], None
+        while True:
+            context = self.client.get(reverse('order_pending_list'), {'cursor': cursor} if cursor else {}).context
+            pages.append([order.id for order in context['orders']])
+            if not context['keyset_page']['has_next']:
+                break
+            cursor = context['keyset_page']['next_cursor']
+        self.assertEqual([order_id for ids in pages for order_id in ids], expected)
+
+        previous = context['keyset_page']['previous_cursor']
+        context = self.client.get(reverse('order_pending_list'), {'cursor': previous}).context
+        self.assertEqual([order.id for order in context['orders']], pages[1])
+
+
+class QueryPlanTests(TestCase):
+    """Hot querysets must be answered from an index, never a full table scan."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, _ = make_customer('customer')
+
+    def hot_querysets(self):
+        moment = timezone.now()
+        return {
+            'customer orders': Order.objects.filter(customer=self.customer).order_by('-order_date', '-id')[:21],
+            'pending board': Order.objects.filter(status='pending').order_by('-order_date', '-id')[:21],
+            'completed board, deep page': (
+                Order.objects.filter(status='completed')
+                .filter(Q(order_date__lt=moment) | Q(order_date=moment, id__lt=100))
+                .order_by('-order_date', '-id')[:21]
+            ),
+            'all orders': Order.objects.order_by('-order_date', '-id')[:21],
+            'menu by rating': Food.objects.filter(category='pizza').order_by('-rating'),
+            'menu by price': Food.objects.filter(category='pizza').order_by('price'),
+            'checkout discount': Discount.objects.filter(code='OFF10', is_active=True, expires_at__gte=moment),
+            'popular foods': Food.objects.filter(popularity__gt=0).order_by('-popularity')[:5],
+            'recommendations': get_recommendations(self.customer),
+            'sales rollup range': DailyFoodSales.objects.filter(date__gte=moment.date()).values('food_id'),
+        }
+
+    def test_hot_queries_use_indexes(self):
+        for label, queryset in self.hot_querysets().items():
+            with self.subTest(label):
+                plan = queryset.explain()
+                full_scans = [
+                    line for line in plan.splitlines()
+                    if re.search(r'\bSCAN (main_\w+)\s*$', line.strip())
+                ]
+                self.assertEqual(full_scans, [], f"{label} falls back to a full scan:\n{plan}")
+                self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan, f"{label} sorts in memory:\n{plan}")
@@ -11,12 +11,16 @@ from main.views import (
     TopSellingFoodsView,
     EmployeeCreateView, EmployeeListView, EmployeeUpdateView, EmployeeDeleteView, EmployeeDashboardView,
     OrderListView, OrderDetailView, OrderPendingListView, OrderCompleteView, OrderCompletedListView,
-    CustomerDashboardView, CustomerFoodListView, CustomerFoodDetailView,
-    CartDetailView, AddToCartView, RemoveFromCartView,
-    CustomerOrderListView, CustomerOrderDetailView,
+    OrderReportView, OrderReportExportView,
+    CustomerDashboardView, CustomerFoodListView, CustomerFoodDetailView, FoodSearchView,
+    CartDetailView, AddToCartView, CartBatchView, RemoveFromCartView,
+    CustomerOrderListView, CustomerOrderDetailView, OrderIntakeStatusView,
     CheckoutView, ManageAddressesView, AddAddressView, CancelOrderView,
     RateFoodView
 )
+from main.api import (
+    FoodListAPIView, FoodDetailAPIView, CartAPIView, OrderListAPIView, OrderDetailAPIView,
+)
 
 urlpatterns = [
     path('', HomeView.as_view(), name='home'),
@@ -61,24 +65,36 @@ urlpatterns = [
     path('orders/pending/', OrderPendingListView.as_view(), name='order_pending_list'),
     path('orders/complete/<int:pk>/', OrderCompleteView.as_view(), name='order_complete'),
     path('orders/completed/', OrderCompletedListView.as_view(), name='order_completed_list'),
+    path('orders/report/', OrderReportView.as_view(), name='order_report'),
+    path('orders/report/export/', OrderReportExportView.as_view(), name='order_report_export'),
 
     # Customer
     path('customer/dashboard/', CustomerDashboardView.as_view(), name='customer_dashboard'),
     path('customer/foods/', CustomerFoodListView.as_view(), name='customer_food_list'),
+    path('customer/foods/search/', FoodSearchView.as_view(), name='customer_food_search'),
     path('customer/food/<int:food_id>/', CustomerFoodDetailView.as_view(), name='customer_food_detail'),
     path('customer/food/rate/<int:food_id>/', RateFoodView.as_view(), name='rate_food'),
 
     path('customer/cart/', CartDetailView.as_view(), name='customer_cart_detail'),
     path('customer/cart/add/<int:food_id>/', AddToCartView.as_view(), name='customer_add_to_cart'),
+    path('customer/cart/batch/', CartBatchView.as_view(), name='customer_cart_batch'),
     path('customer/cart/remove/<int:item_id>/', RemoveFromCartView.as_view(), name='customer_remove_from_cart'),
 
     path('customer/orders/', CustomerOrderListView.as_view(), name='customer_order_list'),
     path('customer/order/<int:order_id>/', CustomerOrderDetailView.as_view(), name='customer_order_detail'),
+    path('customer/order/intake/<str:reference>/', OrderIntakeStatusView.as_view(), name='customer_order_intake'),
 
     path('customer/checkout/', CheckoutView.as_view(), name='customer_checkout'),
     path('manage-addresses/', ManageAddressesView.as_view(), name='manage_addresses'),
     path('add-address/', AddAddressView.as_view(), name='customer_add_address'),
     path('order/cancel/<int:order_id>/', CancelOrderView.as_view(), name='cancel_order'),
+
+    # Read-only JSON API
+    path('api/v1/foods/', FoodListAPIView.as_view(), name='api_food_list'),
+    path('api/v1/foods/<int:food_id>/', FoodDetailAPIView.as_view(), name='api_food_detail'),
+    path('api/v1/cart/', CartAPIView.as_view(), name='api_cart'),
+    path('api/v1/orders/', OrderListAPIView.as_view(), name='api_order_list'),
+    path('api/v1/orders/<int:order_id>/', OrderDetailAPIView.as_view(), name='api_order_detail'),
 ]
 
 if settings.DEBUG:
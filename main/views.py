@@ -5,18 +5,36 @@ from django.views.generic import (
     CreateView, DetailView, FormView
 )
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin, PermissionRequiredMixin
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
+from django.utils.decorators import method_decorator
 from django.utils.timezone import now
-from django.db.models import Count, F
+from django.views.decorators.http import condition
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.utils.dateparse import parse_date
-from collections import Counter
 from decimal import Decimal
+import json
 import re
 
-from main.models import Discount, CartItem, Food, Cart, Order, OrderItem, Employee, FoodRating, Address
+from main.models import (
+    Discount, CartItem, Food, Cart, Order, OrderItem, Employee, FoodRating, Address, InsufficientStock, User
+)
+from main import intake
+from main.carts import add_lines
+from main.popularity import popular_foods, record_completed_order
+from main.recommendations import get_recommendations, record_order
+from main.reservations import claim_holds, sell
+from main.reports import csv_lines, filtered_orders, jsonl_lines, parse_day
+from main.sales import record_status_change, top_selling
+from main.search import SEARCH_RESULTS_LIMIT, filter_matching, search_ids
+from main.similarity import get_similar
+from main.menu import customer_food_detail_etag, customer_food_list_etag, food_list_etag, food_list_modified
+from main.mixins import KeysetPaginationMixin
+from main.roles import get_role, is_employee
 from main.forms import (
     FoodForm, FoodRatingForm, EmployeeForm, SignupForm,
     DiscountForm, CommentReplyForm
@@ -27,7 +45,7 @@ from main.forms import (
 
 class EmployeeRequiredMixin(UserPassesTestMixin):
     def test_func(self):
-        return self.request.user.groups.filter(name='Employee').exists()
+        return is_employee(self.request)
 
     def handle_no_permission(self):
         return redirect('home')
@@ -57,9 +75,10 @@ class HomeView(LoginRequiredMixin, TemplateView):
 
     def dispatch(self, request, *args, **kwargs):
         if request.user.is_authenticated:
-            if request.user.is_superuser:
+            role = get_role(request)
+            if role == User.MANAGER:
                 return redirect(reverse_lazy('manager_dashboard'))
-            elif request.user.groups.filter(name='Employee').exists():
+            elif role == User.EMPLOYEE:
                 return redirect(reverse_lazy('employee_dashboard'))
             return redirect(reverse_lazy('customer_dashboard'))
         return super().dispatch(request, *args, **kwargs)
@@ -106,6 +125,7 @@ class DiscountDeleteView(AdminRequiredMixin, DeleteView):
     success_url = reverse_lazy('discount_list')
 
 
+@method_decorator(condition(etag_func=food_list_etag, last_modified_func=food_list_modified), name='get')
 class FoodListView(LoginRequiredMixin, ListView):
     model = Food
     template_name = 'manager/food_list.html'
@@ -141,7 +161,6 @@ class FoodDetailView(LoginRequiredMixin, View):
                 rating.food = food
                 rating.user = request.user
                 rating.save()
-                food.update_rating()
                 return redirect('food_detail', food_id=food.id)
         ratings = food.ratings.all()
         return render(request, self.template_name, {'food': food, 'ratings': ratings, 'form': form})
@@ -279,11 +298,10 @@ class EmployeeDashboardView(EmployeeRequiredMixin, TemplateView):
 
 # ---------------------- Orders ----------------------
 
-class OrderListView(ListView):
+class OrderListView(KeysetPaginationMixin, ListView):
     model = Order
     template_name = 'order_list.html'
     context_object_name = 'orders'
-    paginate_by = 20
 
     def get_queryset(self):
         qs = Order.objects.all()
@@ -298,15 +316,17 @@ class OrderListView(ListView):
             qs = qs.filter(order_date__lte=parse_date(end_date))
         if not self.request.user.is_superuser:
             qs = qs.filter(customer=self.request.user)
-        return qs
+        elif self.request.GET.get('customer'):
+            qs = qs.filter(customer__username=self.request.GET['customer'])
+        return qs.select_related('customer').prefetch_related('items__food')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        total_revenue = Decimal('0.00')
-        for order in context['orders']:
-            for item in order.items.all():
-                total_revenue += Decimal(item.total_price)
-        context['total_revenue'] = total_revenue
+        # Revenue covers every filtered order, not only the rendered page.
+        revenue = OrderItem.objects.filter(order__in=self.object_list.values('id')).aggregate(
+            total=Sum(F('food__price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2))
+        )
+        context['total_revenue'] = revenue['total'] or Decimal('0.00')
         return context
 
 
@@ -317,13 +337,13 @@ class OrderDetailView(AdminRequiredMixin, DetailView):
     paginate_by = 10
 
     def get_object(self, queryset=None):
-        if self.request.user.is_staff or self.request.user.groups.filter(name='Employee').exists():
-            return get_object_or_404(Order, id=self.kwargs['pk'])
-        return get_object_or_404(Order, id=self.kwargs['pk'], customer=self.request.user)
+        if self.request.user.is_staff or is_employee(self.request):
+            return get_object_or_404(Order.objects.select_related('customer'), id=self.kwargs['pk'])
+        return get_object_or_404(Order.objects.select_related('customer'), id=self.kwargs['pk'], customer=self.request.user)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        items = self.object.items.all()
+        items = self.object.items.select_related('food').order_by('id')
         paginator = Paginator(items, self.paginate_by)
         page = self.request.GET.get('page')
         try:
@@ -340,39 +360,80 @@ class TopSellingFoodsView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        top_selling_foods = (
-            OrderItem.objects.values('food__name', 'food__image')
-            .annotate(total_sales=Count('id'))
-            .order_by('-total_sales')[:10]
-        )
-        context['top_selling_foods'] = top_selling_foods
+        # Dates that are no real day, e.g. 2024-02-30, leave that end open.
+        start_date = parse_day(self.request.GET.get('start_date'))
+        end_date = parse_day(self.request.GET.get('end_date'))
+        context['top_selling_foods'] = top_selling(start_date, end_date)
+        context['start_date'] = start_date
+        context['end_date'] = end_date
         return context
 
 
-class OrderPendingListView(LoginRequiredMixin, EmployeeRequiredMixin, ListView):
+class OrderReportView(AdminRequiredMixin, TemplateView):
+    template_name = 'manager/order_report.html'
+    preview_size = 50
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        orders = filtered_orders(self.request.GET)
+        context['total_revenue'] = orders.aggregate(total=Sum('total_price'))['total'] or Decimal('0.00')
+        context['order_count'] = orders.count()
+        context['orders'] = orders.select_related('customer').order_by('-order_date', '-id')[:self.preview_size]
+        context['preview_size'] = self.preview_size
+        context['query'] = self.request.GET.urlencode()
+        for key in ('status', 'start_date', 'end_date'):
+            context[key] = self.request.GET.get(key, '')
+        return context
+
+
+class OrderReportExportView(AdminRequiredMixin, View):
+    formats = {
+        'csv': (csv_lines, 'text/csv; charset=utf-8'),
+        'jsonl': (jsonl_lines, 'application/x-ndjson; charset=utf-8'),
+    }
+
+    def get(self, request):
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in self.formats:
+            return HttpResponseBadRequest('Unknown export format.')
+        lines, content_type = self.formats[export_format]
+        response = StreamingHttpResponse(lines(filtered_orders(request.GET)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="orders-{now():%Y%m%d-%H%M%S}.{export_format}"'
+        return response
+
+
+class OrderPendingListView(LoginRequiredMixin, EmployeeRequiredMixin, KeysetPaginationMixin, ListView):
     model = Order
     template_name = 'order_pending_list.html'
     context_object_name = 'orders'
+    # Oldest first: those are the most urgent.
+    keyset_descending = False
 
     def get_queryset(self):
-        return Order.objects.filter(status='pending')
+        return Order.objects.filter(status='pending').select_related('customer')
 
 
-class OrderCompletedListView(LoginRequiredMixin, EmployeeRequiredMixin, ListView):
+class OrderCompletedListView(LoginRequiredMixin, EmployeeRequiredMixin, KeysetPaginationMixin, ListView):
     model = Order
     template_name = 'order_completed_list.html'
     context_object_name = 'orders'
 
     def get_queryset(self):
-        return Order.objects.filter(status='completed')
+        return Order.objects.filter(status='completed').select_related('customer')
 
 
 class OrderCompleteView(LoginRequiredMixin, EmployeeRequiredMixin, View):
     def post(self, request, pk):
         order = get_object_or_404(Order, pk=pk)
-        if order.status == 'pending':
-            order.status = 'completed'
-            order.save()
+        with transaction.atomic():
+            completed = Order.objects.filter(pk=order.pk, status='pending').update(
+                status='completed', updated_at=now()
+            )
+            if completed:
+                order.status = 'completed'
+                record_completed_order(order)
+                record_status_change(order, 'pending')
+        if completed:
             return redirect('order_pending_list')
         return redirect('order_detail', pk=pk)
 
@@ -384,25 +445,36 @@ class CustomerDashboardView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         cart = Cart.objects.filter(customer=self.request.user).first()
-        cart_items = cart.items.all() if cart else []
+        cart_items = cart.items.select_related('food') if cart and cart.item_count else []
         orders = Order.objects.filter(customer=self.request.user)
-        total_price = sum(item.food.price * item.quantity for item in cart_items)
         return {
+            'cart': cart,
             'cart_items': cart_items,
             'orders': orders,
-            'total_price': total_price
+            'total_price': cart.subtotal if cart else 0
         }
 
 
+# The customer pages carry per-user parts with no single modification time,
+# so they are validated by ETag only.
+@method_decorator(condition(etag_func=customer_food_list_etag), name='get')
 class CustomerFoodListView(LoginRequiredMixin, TemplateView):
     template_name = 'customer/food_list.html'
 
     def get_context_data(self, **kwargs):
         categories = dict(Food.CATEGORY_CHOICES)
         selected_category = self.request.GET.get('category')
-        sort_by = self.request.GET.get('sort_by', 'rating')
+        query = self.request.GET.get('q', '').strip()
+        sort_by = self.request.GET.get('sort_by', 'relevance' if query else 'rating')
         foods = Food.objects.filter(category=selected_category) if selected_category else Food.objects.all()
 
+        if query and sort_by == 'relevance':
+            ranked = search_ids(query, limit=SEARCH_RESULTS_LIMIT, category=selected_category)
+            position = {pk: index for index, pk in enumerate(ranked)}
+            foods = sorted(Food.objects.filter(pk__in=ranked), key=lambda food: position[food.pk])
+        elif query:
+            foods = filter_matching(foods, query)
+
         if sort_by == 'rating':
             foods = foods.order_by('-rating')
         elif sort_by == 'price_asc':
@@ -415,11 +487,30 @@ class CustomerFoodListView(LoginRequiredMixin, TemplateView):
             'foods': foods,
             'categories': categories,
             'selected_category': selected_category,
+            'query': query,
             'sort_by': sort_by,
             'recommended_foods': recommended_foods
         }
 
 
+class FoodSearchView(LoginRequiredMixin, View):
+    """Autocomplete for the menu search box: the best matches for ``q`` as JSON."""
+
+    def get(self, request):
+        ranked = search_ids(request.GET.get('q', ''), category=request.GET.get('category') or None)
+        foods = Food.objects.only('name', 'category', 'price').in_bulk(ranked)
+        return JsonResponse({'results': [
+            {
+                'id': pk,
+                'name': foods[pk].name,
+                'category': foods[pk].category,
+                'price': foods[pk].price,
+                'url': reverse('customer_food_detail', kwargs={'food_id': pk}),
+            }
+            for pk in ranked if pk in foods
+        ]})
+
+
 class RateFoodView(LoginRequiredMixin, FormView):
     template_name = 'customer/rate_food.html'
     form_class = FoodRatingForm
@@ -437,7 +528,6 @@ class RateFoodView(LoginRequiredMixin, FormView):
         rating.user = self.request.user
         rating.food = self.food
         rating.save()
-        self.food.update_rating()
         messages.success(self.request, 'Your rating has been submitted successfully!')
         return redirect('customer_food_list')
 
@@ -451,27 +541,77 @@ class CartDetailView(LoginRequiredMixin, TemplateView):
     template_name = 'customer/cart_detail.html'
 
     def get_context_data(self, **kwargs):
-        cart, _ = Cart.objects.get_or_create(customer=self.request.user)
+        cart, _ = Cart.objects.prefetch_related('items__food').get_or_create(customer=self.request.user)
         return {'cart': cart}
 
 
 class AddToCartView(LoginRequiredMixin, View):
     def post(self, request, food_id):
         food = get_object_or_404(Food, id=food_id)
-        cart, _ = Cart.objects.get_or_create(customer=request.user)
-        cart_item, _ = CartItem.objects.get_or_create(cart=cart, food=food)
-
         quantity = int(request.POST.get('quantity', 1))
         if quantity < 1:
             messages.error(request, "Quantity must be at least 1.")
             return redirect('customer_food_list')
 
-        cart_item.quantity += quantity - 1
-        cart_item.save()
+        cart, _ = Cart.objects.get_or_create(customer=request.user)
+        try:
+            add_lines(cart, {food.id: quantity})
+        except InsufficientStock:
+            messages.error(request, f"Not enough {food.name} left in stock.")
+            return redirect('customer_food_list')
         messages.success(request, f'{food.name} has been added to your cart with {quantity} quantity.')
         return redirect('customer_cart_detail')
 
 
+class CartBatchView(LoginRequiredMixin, View):
+    """Add many lines in one request: ``{"lines": [{"food_id": 1, "quantity": 2}, ...]}``.
+
+    Responds with the affected lines and the cart's new totals as JSON.
+    """
+    max_lines = 50
+    # Units of one food, and of all foods together, one request may add.
+    max_quantity = 100
+    max_total_quantity = 500
+
+    def post(self, request):
+        try:
+            lines = json.loads(request.body)['lines']
+            quantities = {}
+            for line in lines:
+                food_id, quantity = int(line['food_id']), int(line['quantity'])
+                if quantity < 1:
+                    raise ValueError
+                quantities[food_id] = quantities.get(food_id, 0) + quantity
+        except (ValueError, TypeError, KeyError):
+            return JsonResponse(
+                {'error': 'Expected {"lines": [{"food_id": int, "quantity": int >= 1}, ...]}.'}, status=400
+            )
+        if not quantities or len(quantities) > self.max_lines:
+            return JsonResponse({'error': f'Send between 1 and {self.max_lines} lines.'}, status=400)
+        if max(quantities.values()) > self.max_quantity or sum(quantities.values()) > self.max_total_quantity:
+            return JsonResponse({
+                'error': f'Add at most {self.max_quantity} of one food and {self.max_total_quantity} in total.',
+            }, status=400)
+
+        known = set(Food.objects.filter(id__in=quantities).values_list('id', flat=True))
+        unknown = sorted(set(quantities) - known)
+        if unknown:
+            return JsonResponse({'error': 'Unknown food.', 'food_ids': unknown}, status=400)
+
+        cart, _ = Cart.objects.get_or_create(customer=request.user)
+        try:
+            items = add_lines(cart, quantities)
+        except InsufficientStock as e:
+            return JsonResponse(
+                {'error': f'Not enough {e.food.name} left in stock.', 'food_ids': [e.food.id]}, status=409
+            )
+        cart.refresh_from_db(fields=['subtotal', 'item_count'])
+        return JsonResponse({
+            'lines': [{'food_id': item.food_id, 'quantity': item.quantity} for item in items],
+            'cart': {'subtotal': cart.subtotal, 'item_count': cart.item_count},
+        })
+
+
 class RemoveFromCartView(LoginRequiredMixin, View):
     def post(self, request, item_id):
         cart_item = get_object_or_404(CartItem, id=item_id, cart__customer=request.user)
@@ -479,13 +619,13 @@ class RemoveFromCartView(LoginRequiredMixin, View):
         return redirect('customer_cart_detail')
 
 
-class CustomerOrderListView(LoginRequiredMixin, ListView):
+class CustomerOrderListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Order
     template_name = 'customer/order_list.html'
     context_object_name = 'orders'
 
     def get_queryset(self):
-        return Order.objects.filter(customer=self.request.user).order_by('-order_date', 'status')
+        return Order.objects.filter(customer=self.request.user).prefetch_related('items__food')
 
 
 class CustomerOrderDetailView(LoginRequiredMixin, DetailView):
@@ -494,9 +634,12 @@ class CustomerOrderDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'order'
 
     def get_object(self, queryset=None):
-        return get_object_or_404(Order, id=self.kwargs['order_id'], customer=self.request.user)
+        return get_object_or_404(
+            Order.objects.prefetch_related('items__food'), id=self.kwargs['order_id'], customer=self.request.user
+        )
 
 
+@method_decorator(condition(etag_func=customer_food_detail_etag), name='get')
 class CustomerFoodDetailView(LoginRequiredMixin, TemplateView):
     template_name = 'customer/food_detail.html'
 
@@ -506,32 +649,25 @@ class CustomerFoodDetailView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         existing_rating = FoodRating.objects.filter(food=self.food, user=self.request.user).first()
-        return {'food': self.food, 'existing_rating': existing_rating}
+        return {'food': self.food, 'existing_rating': existing_rating, 'similar_foods': get_similar(self.food)}
 
     def post(self, request, *args, **kwargs):
         existing_rating = FoodRating.objects.filter(food=self.food, user=request.user).first()
-        rating_value = request.POST.get('rating')
-        comment = request.POST.get('comment')
-
-        if existing_rating:
-            existing_rating.rating = rating_value
-            existing_rating.comment = comment
-            existing_rating.save()
-        else:
-            FoodRating.objects.create(
-                food=self.food,
-                user=request.user,
-                rating=rating_value,
-                comment=comment
-            )
+        form = FoodRatingForm(request.POST, instance=existing_rating)
+        if not form.is_valid():
+            return self.render_to_response({**self.get_context_data(), 'form': form}, status=400)
+        rating = form.save(commit=False)
+        rating.food = self.food
+        rating.user = request.user
+        rating.save()
         return redirect('customer_food_detail', food_id=self.food.id)
 
 class CheckoutView(LoginRequiredMixin, TemplateView):
     template_name = 'customer/checkout.html'
 
     def get_context_data(self, **kwargs):
-        cart = Cart.objects.get(customer=self.request.user)
-        total_price = sum(item.total_price for item in cart.items.all())
+        cart = Cart.objects.prefetch_related('items__food').get(customer=self.request.user)
+        total_price = cart.subtotal
         addresses = Address.objects.filter(customer=self.request.user)
         return {
             'cart': cart,
@@ -544,9 +680,10 @@ class CheckoutView(LoginRequiredMixin, TemplateView):
     def post(self, request, *args, **kwargs):
         try:
             cart = Cart.objects.get(customer=request.user)
-            total_price = sum(item.total_price for item in cart.items.all())
+            cart_items = list(cart.items.select_related('food'))
+            total_price = sum(item.total_price for item in cart_items)
 
-            if cart.items.count() == 0:
+            if not cart_items:
                 messages.error(request, 'Your cart is empty.')
                 return redirect('customer_food_list')
 
@@ -586,7 +723,6 @@ class CheckoutView(LoginRequiredMixin, TemplateView):
                 )
                 try:
                     address.full_clean()
-                    address.save()
                 except ValidationError as e:
                     messages.error(request, str(e))
                     return redirect('customer_checkout')
@@ -597,32 +733,35 @@ class CheckoutView(LoginRequiredMixin, TemplateView):
                 messages.error(request, 'Please select an address or enter a new one.')
                 return redirect('customer_checkout')
 
-            # --- سفارش ---
-            order = Order.objects.create(
-                customer=request.user,
-                address=address.address,
-                total_price=final_price,
-                discount_amount=discount_amount,
-                discount_code=discount_code if discount_code else None
-            )
-
-            for cart_item in cart.items.all():
-                OrderItem.objects.create(
-                    order=order,
-                    food=cart_item.food,
-                    quantity=cart_item.quantity
+            # --- صف سفارش ---
+            if intake.enabled():
+                # The line's own hold counts as available to it; other carts' holds do not.
+                short = next(
+                    (item.food for item in cart_items if item.quantity > item.food.available_stock + item.held), None
                 )
-
-                food = cart_item.food
-                quantity = cart_item.quantity
-                if food.stock >= quantity:
-                    food.stock = F('stock') - quantity
-                    food.save()
-                else:
-                    messages.error(request, f"Insufficient stock for {food.name}.")
+                if short:
+                    messages.error(request, f"Insufficient stock for {short.name}.")
                     return redirect('customer_checkout')
+                if new_address:
+                    address.save()
+                reference = intake.enqueue(
+                    request.user, cart_items, address.address, final_price, discount_amount, discount_code
+                )
+                return redirect('customer_order_intake', reference=reference)
+
+            # --- سفارش ---
+            try:
+                with transaction.atomic():
+                    if new_address:
+                        address.save()
+                    order = self.place_order(cart, cart_items, address, final_price, discount_amount, discount_code)
+            except InsufficientStock as e:
+                messages.error(request, f"Insufficient stock for {e.food.name}.")
+                return redirect('customer_checkout')
+            except intake.StaleCart as e:
+                messages.error(request, str(e))
+                return redirect('customer_checkout')
 
-            cart.items.all().delete()
             messages.success(request, 'Your order has been successfully placed!')
             return redirect('customer_order_list')
 
@@ -630,6 +769,64 @@ class CheckoutView(LoginRequiredMixin, TemplateView):
             messages.error(request, 'Your cart is empty or unavailable.')
             return redirect('customer_food_list')
 
+    def place_order(self, cart, cart_items, address, final_price, discount_amount, discount_code):
+        """Create the order, its items and the stock decrements; must run inside one transaction.
+
+        ``cart_items`` is read before the transaction, so the lines are locked
+        and taken out of the cart first: if another checkout took them or their
+        quantities changed, intake.StaleCart rolls everything back.
+        """
+        quantities = {}
+        foods = {}
+        lines = {}
+        for cart_item in cart_items:
+            quantities[cart_item.food_id] = quantities.get(cart_item.food_id, 0) + cart_item.quantity
+            foods[cart_item.food_id] = cart_item.food
+            lines[cart_item.id] = cart_item.quantity
+
+        current = dict(cart.items.select_for_update().filter(id__in=lines).values_list('id', 'quantity'))
+        if current != lines:
+            raise intake.StaleCart('Your cart changed before this order was placed.')
+        # The cart's own holds become part of the sale instead of blocking it.
+        held = claim_holds(list(lines))
+        _, deleted = cart.items.filter(id__in=lines).delete()
+        if deleted.get(CartItem._meta.label, 0) != len(lines):
+            raise intake.StaleCart('Your cart changed before this order was placed.')
+        # Lock rows in a fixed order so concurrent checkouts cannot deadlock.
+        for food_id in sorted(quantities):
+            sell(foods[food_id], quantities[food_id], released=held.get(food_id, 0))
+
+        order = Order.objects.create(
+            customer=self.request.user,
+            address=address.address,
+            total_price=final_price,
+            discount_amount=discount_amount,
+            discount_code=discount_code if discount_code else None
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, food_id=food_id, quantity=quantity)
+            for food_id, quantity in quantities.items()
+        ])
+        record_order(order)
+        return order
+
+
+class OrderIntakeStatusView(LoginRequiredMixin, TemplateView):
+    """Where a queued checkout lands until the intake writer has committed it."""
+    template_name = 'customer/order_intake.html'
+
+    def get(self, request, reference):
+        order_id = Order.objects.filter(
+            intake_reference=reference, customer=request.user
+        ).values_list('id', flat=True).first()
+        if order_id:
+            return redirect('customer_order_detail', order_id=order_id)
+        ticket = intake.ticket_status(reference, request.user)
+        if ticket is None:
+            raise Http404("Unknown order reference.")
+        status, error = ticket
+        return self.render_to_response({'reference': reference, 'status': status, 'error': error})
+
 
 class ManageAddressesView(LoginRequiredMixin, TemplateView):
     template_name = 'customer/manage_addresses.html'
@@ -674,9 +871,17 @@ class AddAddressView(LoginRequiredMixin, TemplateView):
 class CancelOrderView(LoginRequiredMixin, View):
     def post(self, request, order_id):
         order = get_object_or_404(Order, id=order_id, customer=request.user)
+        cancelled = False
         if order.is_cancellable():
-            order.status = 'cancelled'
-            order.save()
+            # Only a still-pending order is cancelled, even if it was completed since it was read.
+            with transaction.atomic():
+                cancelled = Order.objects.filter(pk=order.pk, status='pending').update(
+                    status='cancelled', updated_at=now()
+                )
+                if cancelled:
+                    order.status = 'cancelled'
+                    record_status_change(order, 'pending')
+        if cancelled:
             messages.success(request, 'Your order has been successfully cancelled.')
         else:
             messages.error(request, 'You cannot cancel this order.')
@@ -686,19 +891,7 @@ class CancelOrderView(LoginRequiredMixin, View):
 # ---------------------- Recommendation Helpers ----------------------
 
 def recommend_foods(customer):
-    previous_orders = Order.objects.filter(customer=customer)
-    previous_foods = Food.objects.filter(orderitem__order__in=previous_orders)
-    categories = [food.category for food in previous_foods]
-    return Food.objects.filter(category__in=categories).exclude(id__in=[food.id for food in previous_foods])
-
-
-def popular_foods():
-    food_sales = Counter()
-    orders = Order.objects.filter(status='completed')
-    for order in orders:
-        for item in order.items.all():
-            food_sales[item.food] += item.quantity
-    return [food for food, _ in food_sales.most_common(5)]
+    return get_recommendations(customer)
 
 
 def get_food_recommendations(customer):
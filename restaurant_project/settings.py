@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
     'main',
 ]
 
@@ -48,6 +49,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'main.middleware.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'restaurant_project.urls'
@@ -130,3 +132,94 @@ LOGOUT_REDIRECT_URL = 'login'
 AUTH_USER_MODEL = 'main.User'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+
+# One SQLite file shared by every worker process, see main.cache.SQLiteCache.
+CACHES = {
+    'default': {
+        'BACKEND': 'main.cache.SQLiteCache',
+        'LOCATION': BASE_DIR / 'cache.sqlite3',
+        'OPTIONS': {
+            'MAX_ENTRIES': 50_000,
+            'MAX_SIZE': 64 * 2 ** 20,
+        },
+    }
+}
+
+# Runs the tests with an in-memory cache, see main.test_runner.
+TEST_RUNNER = 'main.test_runner.TestRunner'
+
+# The read-only JSON API under api/v1/, see main.api. It shares the site's
+# login session rather than issuing tokens.
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': ['rest_framework.authentication.SessionAuthentication'],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+}
+
+# Sessions are read from the cache and only written through to the database.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# When enabled, checkouts are queued here and committed in batches by
+# `manage.py process_order_intake`, see main.intake.
+ORDER_INTAKE_QUEUE = False
+ORDER_INTAKE_PATH = BASE_DIR / 'order_intake.sqlite3'
+
+
+# Per-request query budgets, see main.middleware.QueryBudgetMiddleware.
+# Keyed by URL name; routes not listed fall back to QUERY_BUDGET_DEFAULT.
+QUERY_BUDGET_ENABLED = False
+QUERY_BUDGET_DEFAULT = 10
+QUERY_BUDGETS = {
+    'home': 1,
+    'signup': 0,
+    'login': 0,
+    'logout': 3,
+    'profile': 1,
+    'manager_dashboard': 1,
+    'discount_list': 2,
+    'discount_delete': 3,
+    'top_selling_foods': 2,
+    'food_list': 3,
+    'food_detail': 2,
+    'add_food': 1,
+    'edit_food': 7,
+    'delete_food': 2,
+    'edit_rating': 2,
+    'delete_rating': 6,
+    'food_comments': 5,
+    'reply_to_comment': 4,
+    'add_employee': 1,
+    'employee_list': 3,
+    'edit_employee': 2,
+    'delete_employee': 3,
+    'employee_dashboard': 1,
+    'order_list': 6,
+    'order_detail': 4,
+    'order_pending_list': 2,
+    'order_complete': 5,
+    'order_completed_list': 2,
+    'order_report': 4,
+    'order_report_export': 1,
+    'customer_dashboard': 4,
+    'customer_food_list': 5,
+    'customer_food_search': 5,
+    'customer_food_detail': 6,
+    'rate_food': 2,
+    'customer_cart_detail': 4,
+    'customer_add_to_cart': 9,
+    'customer_cart_batch': 12,
+    'customer_remove_from_cart': 4,
+    'customer_order_list': 4,
+    'customer_order_detail': 4,
+    'customer_order_intake': 2,
+    'customer_checkout': 5,
+    'manage_addresses': 2,
+    'customer_add_address': 1,
+    'cancel_order': 2,
+    'api_food_list': 4,
+    'api_food_detail': 4,
+    'api_cart': 5,
+    'api_order_list': 5,
+    'api_order_detail': 5,
+}
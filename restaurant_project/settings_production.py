@@ -0,0 +1,35 @@
+"""
+Production profile: the development settings plus a SQLite configuration
+tuned for several gunicorn workers writing to one database file.
+
+    DJANGO_SETTINGS_MODULE=restaurant_project.settings_production gunicorn restaurant_project.wsgi
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+DATABASES = {
+    'default': {
+        **DATABASES['default'],
+        # Keep each worker's connection open between requests, and check it
+        # before reuse so a broken one is replaced instead of failing a request.
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Seconds a writer waits for the lock before "database is locked".
+            'timeout': 20,
+            # Take the write lock when atomic() starts. A deferred transaction
+            # that reads first and then writes cannot wait for the lock; it
+            # fails at once when another worker is writing.
+            'transaction_mode': 'IMMEDIATE',
+            # Runs on every new connection.
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA cache_size=-32000;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        },
+    }
+}